@@ -0,0 +1,45 @@
+// Points the search forms at another search service with the same query
+// parameters, e.g. the local search of the wiki when there is no Internet
+// access. Open any page once as index.html?backend=http://localhost:8000/search/web
+// and the choice is remembered, index.html?backend=google goes back.
+(function () {
+    var key = 'searchBackend';
+
+    // only absolute http(s) URLs, never e.g. a javascript: one
+    function parseBackend(value) {
+        if (!value) {
+            return null;
+        }
+        try {
+            var url = new URL(value);
+            return url.protocol === 'http:' || url.protocol === 'https:' ? url.href : null;
+        } catch (e) {
+            return null;
+        }
+    }
+
+    var parameter = new URLSearchParams(window.location.search).get('backend');
+    var backend = parseBackend(parameter);
+
+    try {
+        if (parameter === 'google') {
+            localStorage.removeItem(key);
+        } else if (backend) {
+            localStorage.setItem(key, backend);
+        }
+        backend = parseBackend(localStorage.getItem(key));
+    } catch (e) {
+        // storage may be disabled for local files, use the parameter only
+    }
+
+    if (backend) {
+        document.querySelectorAll('form').forEach(function (form) {
+            form.action = backend;
+        });
+        document.querySelectorAll('nav a').forEach(function (link) {
+            var url = new URL(link.href);
+            url.searchParams.set('backend', backend);
+            link.href = url.href;
+        });
+    }
+})();
@@ -1,3 +1,11 @@
 from django.contrib import admin
 
+from .models import EntryMetadata, Image, ImageReference, Link, Revision
+
 # Register your models here.
+
+admin.site.register(EntryMetadata)
+admin.site.register(Image)
+admin.site.register(ImageReference)
+admin.site.register(Link)
+admin.site.register(Revision)
@@ -0,0 +1,272 @@
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+
+
+EntryStat = namedtuple('EntryStat', ['mtime_ns', 'size'])
+
+
+def shard(title):
+    '''
+    Returns the two nested shard directories of an entry, taken from
+    the hash of its lowercase title, e.g. `ab/cd`.
+    '''
+    digest = hashlib.sha1(title.lower().encode('utf-8')).hexdigest()
+    return f'{digest[:2]}/{digest[2:4]}'
+
+
+class FileSystemBackend:
+    '''
+    Stores each encyclopedia entry as a Markdown file named after its
+    title in a directory of the default storage.
+
+    With `sharded` the files are spread over two levels of subdirectories
+    named by the hash of the lowercase title, `entries/ab/cd/Title.md`,
+    so that no directory grows past a few entries even for very large
+    corpora. Use the `shard_entries` command to convert between layouts.
+    '''
+
+    # the backend has no search of its own, the full-text index is used
+    supports_search = False
+
+    def __init__(self, directory='entries', sharded=False):
+        self.directory = directory
+        self.sharded = sharded
+
+    def _name(self, title):
+        if self.sharded:
+            return f'{self.directory}/{shard(title)}/{title}.md'
+        return f'{self.directory}/{title}.md'
+
+    def _files(self):
+        root = default_storage.path(self.directory)
+        if not self.sharded:
+            directories = [root]
+        else:
+            directories = [os.path.join(root, first, second)
+                           for first in os.listdir(root) if len(first) == 2
+                           for second in os.listdir(os.path.join(root, first))]
+        for directory in directories:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.md') and entry.is_file():
+                        yield entry
+
+    def list_titles(self):
+        return [entry.name[:-3] for entry in self._files()]
+
+    def read(self, title):
+        try:
+            with default_storage.open(self._name(title)) as f:
+                return f.read().decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def write(self, title, content):
+        filename = self._name(title)
+        if default_storage.exists(filename):
+            default_storage.delete(filename)
+        default_storage.save(filename, ContentFile(content))
+
+    def write_many(self, entries):
+        for title, content in entries:
+            self.write(title, content)
+
+    def stat(self, title):
+        try:
+            stat = os.stat(default_storage.path(self._name(title)))
+        except FileNotFoundError:
+            return None
+        return EntryStat(stat.st_mtime_ns, stat.st_size)
+
+    def stats(self):
+        '''
+        Returns the status of every entry keyed by title.
+        '''
+        stats = {}
+        for entry in self._files():
+            stat = entry.stat()
+            stats[entry.name[:-3]] = EntryStat(stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def version(self):
+        '''
+        Returns a value that changes whenever an entry is added or
+        removed, here the modification time of the entries directory.
+        In the sharded layout a file only changes the directory of its
+        shard, so it is the latest modification time of all the shard
+        directories, one `stat` per shard rather than per entry.
+        '''
+        root = default_storage.path(self.directory)
+        try:
+            version = os.stat(root).st_mtime_ns
+            if self.sharded:
+                with os.scandir(root) as it:
+                    firsts = [entry.path for entry in it if len(entry.name) == 2 and entry.is_dir()]
+                for first in firsts:
+                    with os.scandir(first) as it:
+                        version = max([version, os.stat(first).st_mtime_ns]
+                                      + [entry.stat().st_mtime_ns for entry in it if entry.is_dir()])
+        except (FileNotFoundError, NotImplementedError):
+            return None
+        return version
+
+
+class SQLiteBackend:
+    '''
+    Stores the encyclopedia entries in a SQLite database, with an FTS5
+    table kept in sync by triggers for full-text search.
+    '''
+
+    supports_search = True
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL UNIQUE,
+            content TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS generation (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO generation (id, value) VALUES (0, 0);
+        CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+            title, content, content='entries', content_rowid='id'
+        );
+        CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+            INSERT INTO entries_fts (rowid, title, content)
+            VALUES (new.id, new.title, new.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+            INSERT INTO entries_fts (entries_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries BEGIN
+            INSERT INTO entries_fts (entries_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO entries_fts (rowid, title, content)
+            VALUES (new.id, new.title, new.content);
+        END;
+    '''
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(settings.BASE_DIR, 'entries.sqlite3')
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_created = False
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with self._schema_lock:
+                if not self._schema_created:
+                    connection.executescript(self.schema)
+                    self._schema_created = True
+            self._local.connection = connection
+        return connection
+
+    def list_titles(self):
+        return [title for title, in self._connection().execute('SELECT title FROM entries')]
+
+    def read(self, title):
+        row = self._connection().execute(
+            'SELECT content FROM entries WHERE title = ?', (title,)).fetchone()
+        return row[0] if row is not None else None
+
+    def write(self, title, content):
+        self.write_many([(title, content)])
+
+    def write_many(self, entries):
+        '''
+        Saves several entries in a single transaction.
+        '''
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for title, content in entries:
+                connection.execute(
+                    'INSERT INTO entries (title, content, mtime_ns, size) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (title) DO UPDATE SET content = excluded.content, '
+                    'mtime_ns = excluded.mtime_ns, size = excluded.size',
+                    (title, content, time.time_ns(), len(content.encode('utf-8'))))
+            connection.execute('UPDATE generation SET value = value + 1')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def stat(self, title):
+        row = self._connection().execute(
+            'SELECT mtime_ns, size FROM entries WHERE title = ?', (title,)).fetchone()
+        return EntryStat(*row) if row is not None else None
+
+    def stats(self):
+        return {title: EntryStat(mtime_ns, size) for title, mtime_ns, size in
+                self._connection().execute('SELECT title, mtime_ns, size FROM entries')}
+
+    def version(self):
+        '''
+        Returns the generation counter bumped by every write.
+        '''
+        return self._connection().execute('SELECT value FROM generation').fetchone()[0]
+
+    def search(self, query, limit=50):
+        '''
+        Returns the titles of the entries matching any word of the query,
+        ranked by the FTS5 BM25 function with titles weighted higher.
+        '''
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        match = ' OR '.join('"{}"'.format(word) for word in words)
+        return [title for title, in self._connection().execute(
+            'SELECT title FROM entries_fts WHERE entries_fts MATCH ? '
+            'ORDER BY bm25(entries_fts, 3.0, 1.0) LIMIT ?', (match, limit))]
+
+    def query(self, query, limit=None):
+        '''
+        Returns the titles of the entries matching a Query of the full-text
+        index, translated to an FTS5 expression, ranked like `search`.
+        '''
+        def phrase(tokens):
+            return '"{}"'.format(' '.join(tokens))
+
+        parts = [phrase(tokens) for tokens in query.required]
+        parts.extend('({})'.format(' OR '.join(phrase(tokens) for tokens in group))
+                     for group in query.optional)
+        if not parts:
+            return []
+        match = ' AND '.join(parts)
+        for tokens in query.excluded:
+            match = f'({match}) NOT {phrase(tokens)}'
+        return [title for title, in self._connection().execute(
+            'SELECT title FROM entries_fts WHERE entries_fts MATCH ? '
+            'ORDER BY bm25(entries_fts, 3.0, 1.0) LIMIT ?',
+            (match, limit if limit is not None else -1))]
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend():
+    '''
+    Returns the entry storage backend configured by `WIKI_ENTRY_BACKEND`
+    and `WIKI_ENTRY_BACKEND_OPTIONS`.
+    '''
+    backend = getattr(settings, 'WIKI_ENTRY_BACKEND', 'encyclopedia.backends.FileSystemBackend')
+    options = getattr(settings, 'WIKI_ENTRY_BACKEND_OPTIONS', {})
+    return import_string(backend)(**options)
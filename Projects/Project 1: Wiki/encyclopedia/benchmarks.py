@@ -0,0 +1,39 @@
+import random
+import string
+
+
+def synthetic_titles(count, seed=0):
+    '''
+    Returns `count` distinct random titles made of one to three words.
+    '''
+    rng = random.Random(seed)
+    titles = set()
+    while len(titles) < count:
+        words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))).capitalize()
+                 for _ in range(rng.randint(1, 3))]
+        titles.add(' '.join(words))
+    return sorted(titles)
+
+
+def synthetic_entry(title, rng, vocabulary, paragraphs=5):
+    '''
+    Returns the Markdown content of a random entry with a heading,
+    a few paragraphs of words drawn from `vocabulary` and a list.
+    '''
+    lines = [f'# {title}', '']
+    for _ in range(paragraphs):
+        lines.append(' '.join(rng.choices(vocabulary, k=rng.randint(40, 120))) + '.')
+        lines.append('')
+    lines.extend(f'* {word}' for word in rng.choices(vocabulary, k=5))
+    return '\n'.join(lines) + '\n'
+
+
+def synthetic_corpus(count, seed=0):
+    '''
+    Yields `count` pairs of a title and the Markdown content of a random entry.
+    '''
+    rng = random.Random(seed)
+    vocabulary = synthetic_titles(2000, seed=seed + 1)
+    vocabulary = [word.lower() for title in vocabulary for word in title.split()]
+    for title in synthetic_titles(count, seed=seed):
+        yield title, synthetic_entry(title, rng, vocabulary)
@@ -0,0 +1,127 @@
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, bumps are then not serialized between processes
+    fcntl = None
+
+
+class Generation:
+    '''
+    A counter shared by all processes serving the encyclopedia through
+    a small memory-mapped file, used to keep their in-process caches
+    coherent without an external broker.
+
+    Every `save_entry` bumps the counter. Each process checks it once per
+    request (see `CoherenceMiddleware`), which costs a read of eight bytes
+    of shared memory, and runs the registered callbacks when another
+    process has bumped it since the last check.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._seen = None
+        self._callbacks = []
+        self.checks = 0
+        self.changes = 0
+        self.check_ns = 0
+
+    def _path(self):
+        if self.path is not None:
+            return self.path
+        return getattr(settings, 'WIKI_GENERATION_PATH',
+                       os.path.join(settings.BASE_DIR, '.wiki-generation'))
+
+    def _mapped(self):
+        if self._map is None:
+            with self._lock:
+                if self._map is None:
+                    fd = os.open(self._path(), os.O_RDWR | os.O_CREAT, 0o644)
+                    if os.fstat(fd).st_size < 8:
+                        os.ftruncate(fd, 8)
+                    self._file = fd
+                    self._map = mmap.mmap(fd, 8)
+        return self._map
+
+    def value(self):
+        return struct.unpack_from('<Q', self._mapped(), 0)[0]
+
+    def subscribe(self, callback):
+        '''
+        Registers a function called without arguments whenever another
+        process has changed the entries.
+        '''
+        self._callbacks.append(callback)
+
+    def bump(self):
+        '''
+        Announces a change of the entries to the other processes.
+        '''
+        mapped = self._mapped()
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            value = struct.unpack_from('<Q', mapped, 0)[0] + 1
+            struct.pack_into('<Q', mapped, 0, value)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+        with self._lock:
+            # our own change needs no invalidation, unless we were behind
+            if self._seen == value - 1:
+                self._seen = value
+
+    def check(self):
+        '''
+        Runs the callbacks if the counter changed since the last check.
+        '''
+        start = time.perf_counter_ns()
+        value = self.value()
+        changed = value != self._seen
+        if changed:
+            with self._lock:
+                changed = value != self._seen
+                if changed:
+                    first = self._seen is None
+                    self._seen = value
+            if changed and not first:
+                for callback in self._callbacks:
+                    callback()
+                self.changes += 1
+        self.checks += 1
+        self.check_ns += time.perf_counter_ns() - start
+
+    def stats(self):
+        return {
+            'generation': self.value(),
+            'checks': self.checks,
+            'changes': self.changes,
+            'average_check_us': round(self.check_ns / self.checks / 1000, 3) if self.checks else 0,
+        }
+
+
+generation = Generation()
+
+
+class CoherenceMiddleware:
+    '''
+    Brings the in-process caches up to date with the changes made by
+    other processes before each request is handled.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        generation.check()
+        return self.get_response(request)
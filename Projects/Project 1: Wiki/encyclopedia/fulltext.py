@@ -0,0 +1,415 @@
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter, namedtuple
+from itertools import accumulate
+
+from django.conf import settings
+
+from .backends import get_backend
+
+
+TOKEN_RE = re.compile(r'\w+')
+QUERY_RE = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+
+# each part of `required` and `excluded` is a phrase, a list of one or
+# more consecutive tokens, each part of `optional` is a group of phrases
+# joined by OR, of which one must be present
+Query = namedtuple('Query', ['required', 'optional', 'excluded'])
+
+
+def tokenize(text):
+    '''
+    Splits text into lowercase word tokens.
+    '''
+    return TOKEN_RE.findall(text.lower())
+
+
+def parse_query(q='', all_words='', phrase='', any_words='', none_words=''):
+    '''
+    Returns the Query for the parameters of a Google search: `q` with
+    its "quoted phrases", -excluded words and words joined by OR, and
+    the fields of the advanced search form, all of which must match.
+    '''
+    required, optional, excluded = [], [], []
+    groups = []
+    joined = False
+    for minus, quoted, word in QUERY_RE.findall(q):
+        if word == 'OR':
+            joined = True
+            continue
+        tokens = tokenize(quoted if not word else word.lstrip('-'))
+        if not tokens:
+            continue
+        if minus or (word.startswith('-') and len(word) > 1):
+            excluded.append(tokens)
+            # an excluded phrase is no alternative, nor is the phrase after it
+            joined = False
+        elif joined and groups:
+            groups[-1].append(tokens)
+            joined = False
+        else:
+            groups.append([tokens])
+            joined = False
+    # phrases joined by OR are alternatives, the others are all required
+    for group in groups:
+        if len(group) > 1:
+            optional.append(group)
+        else:
+            required.append(group[0])
+
+    required.extend([token] for token in tokenize(all_words))
+    if tokenize(phrase):
+        required.append(tokenize(phrase))
+    if tokenize(any_words):
+        optional.append([[token] for token in tokenize(any_words)])
+    excluded.extend([token] for token in tokenize(none_words))
+    return Query(required, optional, excluded)
+
+
+def _deltas(offsets):
+    # the increasing word offsets of a term, each as the gap from the previous one
+    return [offset - previous for previous, offset in zip([0] + offsets, offsets)]
+
+
+def query_words(query):
+    '''
+    Returns the words of the required and optional phrases of a Query.
+    '''
+    return [token for tokens in query.required for token in tokens] + \
+        [token for group in query.optional for tokens in group for token in tokens]
+
+
+class InvertedIndex:
+    '''
+    A full-text index over the titles and bodies of encyclopedia entries,
+    ranked with BM25. Each posting also keeps the word offsets of its
+    term in the entry, delta-encoded in an `array('I')`, so that phrase
+    queries are answered from the index alone by intersecting the offsets
+    of their words in the entries holding all of them.
+
+    The index is persisted as a JSON snapshot plus an append-only journal
+    of the entries indexed since the snapshot was written, so that saving
+    an entry costs one short append instead of rewriting the whole index.
+    On load the journal is replayed and the result is reconciled against
+    the modification times of the entries, so only entries changed while
+    no process was running are re-tokenized.
+    '''
+
+    k1 = 1.5
+    b = 0.75
+    # the title counts as this many occurrences of each of its words
+    title_weight = 3
+
+    def __init__(self, path=None, backend=None):
+        self.path = path
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        self.postings = {}
+        self.positions = {}
+        self.docs = {}
+        self.doc_terms = {}
+        self.total_length = 0
+        self.journal_length = 0
+        self.journal_offset = 0
+        self.snapshot_version = None
+
+    def _path(self):
+        if self.path is not None:
+            return self.path
+        return getattr(settings, 'WIKI_SEARCH_INDEX_PATH',
+                       os.path.join(settings.BASE_DIR, 'search_index.json'))
+
+    def _backend(self):
+        return self.backend or get_backend()
+
+    def _journal_path(self):
+        return self._path() + '.log'
+
+    def _analyze(self, title, content):
+        '''
+        Returns the term frequencies of an entry and the delta-encoded
+        offsets of each term, the title coming first and separated by a
+        gap so that no phrase spans the title and the body.
+        '''
+        title_tokens = tokenize(title)
+        content_tokens = tokenize(content)
+        terms = Counter(content_tokens)
+        for term in title_tokens:
+            terms[term] += self.title_weight
+        offsets = {}
+        for offset, term in enumerate(title_tokens + [None] + content_tokens):
+            if term is not None:
+                offsets.setdefault(term, []).append(offset)
+        return terms, {term: _deltas(term_offsets) for term, term_offsets in offsets.items()}
+
+    def _apply(self, title, terms, mtime, positions=None):
+        self._remove(title)
+        if terms is None:
+            return
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[title] = tf
+            self.positions.setdefault(term, {})[title] = array('I', positions[term])
+        length = sum(terms.values())
+        self.docs[title] = [length, mtime]
+        self.doc_terms[title] = list(terms)
+        self.total_length += length
+
+    def _remove(self, title):
+        if title not in self.docs:
+            return
+        for term in self.doc_terms.pop(title):
+            postings = self.postings[term]
+            del postings[title]
+            del self.positions[term][title]
+            if not postings:
+                del self.postings[term]
+                del self.positions[term]
+        self.total_length -= self.docs.pop(title)[0]
+
+    def _journal(self, records):
+        with open(self._journal_path(), 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        self.journal_length += len(records)
+
+    def _current_snapshot_version(self):
+        try:
+            stat = os.stat(self._path())
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read_snapshot(self):
+        self.snapshot_version = self._current_snapshot_version()
+        try:
+            with open(self._path(), encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if 'positions' not in snapshot:
+            # written before the word offsets were kept, reconciling rebuilds it
+            return
+        self.postings = snapshot['postings']
+        self.positions = {term: {title: array('I', deltas) for title, deltas in positions.items()}
+                          for term, positions in snapshot['positions'].items()}
+        self.docs = snapshot['docs']
+        self.total_length = sum(length for length, _ in self.docs.values())
+        for term, postings in self.postings.items():
+            for title in postings:
+                self.doc_terms.setdefault(title, []).append(term)
+
+    def _read_journal(self):
+        '''
+        Applies the journal records written since the last read. Records
+        written by this process are applied again, which is harmless.
+        '''
+        try:
+            with open(self._journal_path(), 'rb') as f:
+                f.seek(self.journal_offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # a record still being written by another process
+                        break
+                    record = json.loads(line)
+                    if record.get('terms') is not None and 'positions' not in record:
+                        # written before the word offsets were kept,
+                        # reconciling indexes the entry again
+                        record['terms'], record['mtime'] = None, None
+                    self._apply(record['title'], record.get('terms'), record.get('mtime'),
+                                record.get('positions'))
+                    self.journal_length += 1
+                    self.journal_offset += len(line)
+        except FileNotFoundError:
+            pass
+
+    def _reconcile(self):
+        backend = self._backend()
+        mtimes = {title: stat.mtime_ns for title, stat in backend.stats().items()}
+        records = []
+        for title in [title for title in self.docs if title not in mtimes]:
+            self._remove(title)
+            records.append({'title': title})
+        for title, mtime in mtimes.items():
+            doc = self.docs.get(title)
+            if doc is None or doc[1] != mtime:
+                content = backend.read(title)
+                if content is None:
+                    continue
+                terms, positions = self._analyze(title, content)
+                self._apply(title, terms, mtime, positions)
+                records.append({'title': title, 'terms': terms, 'positions': positions,
+                                 'mtime': mtime})
+        if records:
+            self._journal(records)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._reset()
+                self._read_snapshot()
+                self._read_journal()
+                self._reconcile()
+                self._loaded = True
+                self._maybe_compact()
+
+    def _maybe_compact(self):
+        limit = getattr(settings, 'WIKI_SEARCH_JOURNAL_LIMIT', 1000)
+        if self.journal_length > limit:
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        path = self._path()
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # the offset arrays are written as lists of deltas
+            json.dump({'docs': self.docs, 'postings': self.postings,
+                       'positions': self.positions}, f, default=list)
+        os.replace(tmp_path, path)
+        try:
+            os.remove(self._journal_path())
+        except FileNotFoundError:
+            pass
+        self.journal_length = 0
+        self.journal_offset = 0
+        self.snapshot_version = self._current_snapshot_version()
+
+    def update(self, title, content):
+        '''
+        Re-indexes a single entry after it has been saved.
+        '''
+        mtime = self._backend().stat(title).mtime_ns
+        terms, positions = self._analyze(title, content)
+        with self._lock:
+            # the journal is written even if this process has not loaded
+            # the index, so that the other processes can catch up
+            self._journal([{'title': title, 'terms': terms, 'positions': positions,
+                            'mtime': mtime}])
+            if self._loaded:
+                self._apply(title, terms, mtime, positions)
+                self._maybe_compact()
+
+    def refresh(self):
+        '''
+        Catches up with the entries indexed by other processes by reading
+        the tail of the journal, or reloads the index on the next search
+        if another process has compacted it into a new snapshot.
+        '''
+        if not self._loaded:
+            return
+        with self._lock:
+            if self._current_snapshot_version() != self.snapshot_version:
+                self._loaded = False
+            else:
+                self._read_journal()
+
+    def clear(self):
+        '''
+        Drops the loaded index so that the next search loads it again.
+        '''
+        with self._lock:
+            self._reset()
+            self._loaded = False
+
+    def rebuild(self):
+        '''
+        Re-indexes every entry from scratch and writes a fresh snapshot.
+        '''
+        with self._lock:
+            self._reset()
+            self._reconcile()
+            self._write_snapshot()
+            self._loaded = True
+
+    def search(self, query, limit=50):
+        '''
+        Returns the titles of the entries best matching the query,
+        most relevant first.
+        '''
+        self._ensure_loaded()
+        terms = set(tokenize(query))
+        if not terms or not self.docs:
+            return []
+
+        with self._lock:
+            scores = self._scores(terms)
+        return [title for title, _ in scores.most_common(limit)]
+
+    def _scores(self, terms, titles=None):
+        # the BM25 score of each entry, or only of the given entries
+        n = len(self.docs)
+        avg_length = self.total_length / n
+        scores = Counter()
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for title, tf in postings.items():
+                if titles is not None and title not in titles:
+                    continue
+                length = self.docs[title][0]
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[title] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def _phrase(self, tokens):
+        # the entries containing the tokens one after the other
+        postings = [self.postings.get(token) for token in tokens]
+        if not all(postings):
+            return set()
+        titles = set(postings[0]).intersection(*postings[1:])
+        if len(tokens) == 1:
+            return titles
+        found = set()
+        for title in titles:
+            # the offsets where the phrase would start, narrowed word by word
+            starts = set(accumulate(self.positions[tokens[0]][title]))
+            for i, token in enumerate(tokens[1:], 1):
+                starts &= {offset - i for offset in accumulate(self.positions[token][title])}
+                if not starts:
+                    break
+            else:
+                found.add(title)
+        return found
+
+    def query(self, query, limit=None):
+        '''
+        Returns the titles of the entries matching a Query: containing
+        every required phrase, one phrase of each group of optional ones
+        and none of the excluded phrases, most relevant first.
+        '''
+        self._ensure_loaded()
+        if not query.required and not query.optional:
+            return []
+
+        with self._lock:
+            if not self.docs:
+                return []
+            matches = None
+            for tokens in query.required:
+                found = self._phrase(tokens)
+                matches = found if matches is None else matches & found
+            for group in query.optional:
+                found = set().union(*(self._phrase(tokens) for tokens in group))
+                matches = found if matches is None else matches & found
+            for tokens in query.excluded:
+                if not matches:
+                    break
+                matches -= self._phrase(tokens)
+            if not matches:
+                return []
+            scores = self._scores(set(query_words(query)), matches)
+        return [title for title, _ in scores.most_common(limit)]
+
+
+search_index = InvertedIndex()
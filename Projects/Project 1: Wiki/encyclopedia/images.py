@@ -0,0 +1,283 @@
+import io
+import os
+import re
+import struct
+import threading
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .fulltext import query_words, tokenize
+from .models import Image, ImageReference
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    # dimensions are then read from the file headers and no thumbnails are made
+    PILImage = None
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+MARKDOWN_IMAGE_RE = re.compile(r'!\[([^\]]*)\]\(\s*/images/([^)\s]+)(?:\s+"([^"]*)")?\s*\)')
+HTML_IMAGE_RE = re.compile(r'<img\s[^>]*>', re.IGNORECASE)
+ATTRIBUTE_RE = re.compile(r'''(\w+)\s*=\s*["']([^"']*)["']''')
+
+# the name of an image counts as this many occurrences of each of its words
+NAME_WEIGHT = 3
+
+
+def _directory():
+    return getattr(settings, 'WIKI_IMAGE_DIRECTORY', 'images')
+
+
+def _thumbnail_size():
+    return getattr(settings, 'WIKI_THUMBNAIL_SIZE', 200)
+
+
+def extract_images(content):
+    '''
+    Returns the images of the images directory shown by the Markdown
+    content, through ![alt](/images/NAME "caption") or <img> tags,
+    with the alt text and captions given to each.
+    '''
+    images = {}
+    for alt, path, caption in MARKDOWN_IMAGE_RE.findall(content):
+        images.setdefault(unquote(path), []).extend(text for text in (alt, caption) if text)
+    for tag in HTML_IMAGE_RE.findall(content):
+        attributes = {name.lower(): value for name, value in ATTRIBUTE_RE.findall(tag)}
+        src = attributes.get('src', '')
+        if src.startswith('/images/'):
+            images.setdefault(unquote(src[len('/images/'):]), []).extend(
+                attributes[name] for name in ('alt', 'title') if attributes.get(name))
+    return {path: ' '.join(texts) for path, texts in images.items()}
+
+
+def read_dimensions(data):
+    '''
+    Returns the width and height of a PNG, GIF or JPEG image from the
+    first bytes of its file, or None if they cannot be found there.
+    '''
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(data) and data[i] == 0xFF:
+            marker = data[i + 1]
+            # the start of frame segments, which hold the dimensions
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    return None
+
+
+def _scaled(width, height, size):
+    if not width or not height:
+        return None, None
+    scale = min(size / width, size / height, 1)
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def _describe(name):
+    '''
+    Returns the dimensions of an image file and, with Pillow, a thumbnail
+    of it with its content type.
+    '''
+    size = _thumbnail_size()
+    with default_storage.open(name) as f:
+        if PILImage is not None:
+            try:
+                with PILImage.open(f) as image:
+                    width, height = image.size
+                    image.thumbnail((size, size))
+                    if image.mode in ('RGBA', 'LA', 'P'):
+                        kind = 'PNG'
+                    else:
+                        kind = 'JPEG'
+                        image = image.convert('RGB')
+                    thumbnail = io.BytesIO()
+                    image.save(thumbnail, kind)
+                    return (width, height), thumbnail.getvalue(), f'image/{kind.lower()}', image.size
+            except (OSError, ValueError):
+                f.seek(0)
+        dimensions = read_dimensions(f.read(65536))
+    return dimensions, b'', '', _scaled(*(dimensions or (None, None)), size)
+
+
+def index_images():
+    '''
+    Brings the image rows up to date with the images directory: new and
+    changed images are measured and get a thumbnail, the rows of removed
+    images are deleted. Returns the number of images (re)indexed.
+    '''
+    directory = _directory()
+    try:
+        root = default_storage.path(directory)
+    except NotImplementedError:
+        return 0
+    known = {path: (mtime_ns, size) for path, mtime_ns, size in
+             Image.objects.values_list('path', 'mtime_ns', 'size')}
+
+    found = set()
+    indexed = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for filename in filenames:
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            full_path = os.path.join(dirpath, filename)
+            path = os.path.relpath(full_path, root).replace(os.sep, '/')
+            found.add(path)
+            stat = os.stat(full_path)
+            if known.get(path) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            dimensions, thumbnail, thumbnail_type, thumbnail_dimensions = \
+                _describe(f'{directory}/{path}')
+            width, height = dimensions or (None, None)
+            Image.objects.update_or_create(path=path, defaults={
+                'width': width,
+                'height': height,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'thumbnail': thumbnail,
+                'thumbnail_type': thumbnail_type,
+                'thumbnail_width': thumbnail_dimensions[0],
+                'thumbnail_height': thumbnail_dimensions[1],
+            })
+            indexed += 1
+
+    removed = set(known) - found
+    if removed:
+        Image.objects.filter(path__in=removed).delete()
+    if indexed or removed:
+        image_index.clear()
+    return indexed
+
+
+def update_references(title, content):
+    '''
+    Updates the images shown by an entry after it has been saved.
+    Returns whether anything changed.
+    '''
+    images = extract_images(content)
+    with transaction.atomic():
+        existing = dict(ImageReference.objects.filter(source=title).values_list('image', 'text'))
+        removed = set(existing) - set(images)
+        if removed:
+            ImageReference.objects.filter(source=title, image__in=removed).delete()
+        for image, text in images.items():
+            if image in existing and existing[image] != text:
+                ImageReference.objects.filter(source=title, image=image).update(text=text)
+        ImageReference.objects.bulk_create([ImageReference(source=title, image=image, text=text)
+                                            for image, text in images.items()
+                                            if image not in existing])
+    changed = bool(removed) or any(existing.get(image) != text for image, text in images.items())
+    if changed:
+        image_index.clear()
+    return changed
+
+
+def rebuild_references(entries, batch_size=1000):
+    '''
+    Replaces all image references with those of the given pairs
+    of titles and Markdown content.
+    '''
+    with transaction.atomic():
+        ImageReference.objects.all().delete()
+        batch = []
+        for title, content in entries:
+            batch.extend(ImageReference(source=title, image=image, text=text)
+                         for image, text in extract_images(content).items())
+            if len(batch) >= batch_size:
+                ImageReference.objects.bulk_create(batch)
+                batch = []
+        ImageReference.objects.bulk_create(batch)
+    image_index.clear()
+
+
+class ImageIndex:
+    '''
+    An in-memory index of the words describing each image: the words of
+    its file name and the alt texts and captions the entries give it.
+
+    It is loaded from the database on the first query after a change, and
+    holds everything the result grid shows, so answering a query opens
+    no image file and transfers no thumbnail.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._images = None
+
+    def _load(self):
+        texts = {}
+        for image, text in ImageReference.objects.values_list('image', 'text'):
+            texts.setdefault(image, []).append(text)
+
+        images = {}
+        postings = {}
+        for image in Image.objects.values('id', 'path', 'width', 'height', 'mtime_ns',
+                                          'thumbnail_type', 'thumbnail_width', 'thumbnail_height'):
+            name = tokenize(os.path.splitext(image['path'])[0])
+            # a gap between the texts so that no phrase spans two of them
+            tokens = name + ['']
+            for text in texts.get(image['path'], ()):
+                tokens.extend(tokenize(text) + [''])
+            image['tokens'] = tokens
+            image['name'] = set(name)
+            images[image['id']] = image
+            for token in tokens:
+                if token:
+                    postings.setdefault(token, set()).add(image['id'])
+        self._postings = postings
+        self._images = images
+
+    def clear(self):
+        with self._lock:
+            self._images = None
+
+    def _phrase(self, tokens):
+        ids = set.intersection(*(self._postings.get(token, set()) for token in tokens))
+        if len(tokens) == 1:
+            return ids
+        return {id for id in ids if any(
+            self._images[id]['tokens'][i:i + len(tokens)] == tokens
+            for i in range(len(self._images[id]['tokens']) - len(tokens) + 1))}
+
+    def query(self, query):
+        '''
+        Returns the images matching a full-text Query, those whose names
+        and descriptions use the words of the query most often first.
+        '''
+        if not query.required and not query.optional:
+            return []
+        with self._lock:
+            if self._images is None:
+                self._load()
+            matches = None
+            for tokens in query.required:
+                found = self._phrase(tokens)
+                matches = found if matches is None else matches & found
+            for group in query.optional:
+                found = set().union(*(self._phrase(tokens) for tokens in group))
+                matches = found if matches is None else matches & found
+            for tokens in query.excluded:
+                matches -= self._phrase(tokens)
+
+            terms = set(query_words(query))
+
+            def score(id):
+                image = self._images[id]
+                return sum(image['tokens'].count(term) + (NAME_WEIGHT - 1) * (term in image['name'])
+                           for term in terms)
+
+            ranked = sorted(matches, key=lambda id: (-score(id), self._images[id]['path']))
+            return [self._images[id] for id in ranked]
+
+
+image_index = ImageIndex()
@@ -0,0 +1,81 @@
+import re
+from urllib.parse import unquote
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Link
+
+
+LINK_RE = re.compile(r'''(?:\]\(\s*|href=["'])/wiki/([^)\s"'#?]+)''')
+
+
+def extract_links(content):
+    '''
+    Returns the titles of the encyclopedia entries linked from the
+    Markdown content through `/wiki/TITLE` links.
+    '''
+    return {unquote(target) for target in LINK_RE.findall(content)}
+
+
+def update(title, content):
+    '''
+    Updates the outgoing links of an entry after it has been saved,
+    touching only the links that were added or removed.
+    '''
+    targets = extract_links(content)
+    with transaction.atomic():
+        existing = set(Link.objects.filter(source=title).values_list('target', flat=True))
+        removed = existing - targets
+        if removed:
+            Link.objects.filter(source=title, target__in=removed).delete()
+        Link.objects.bulk_create([Link(source=title, target=target)
+                                  for target in targets - existing])
+
+
+def rebuild(entries, batch_size=1000):
+    '''
+    Replaces the whole link graph with the links of the given
+    pairs of titles and Markdown content.
+    '''
+    with transaction.atomic():
+        Link.objects.all().delete()
+        batch = []
+        for title, content in entries:
+            batch.extend(Link(source=title, target=target) for target in extract_links(content))
+            if len(batch) >= batch_size:
+                Link.objects.bulk_create(batch)
+                batch = []
+        Link.objects.bulk_create(batch)
+
+
+def get_backlinks(title):
+    '''
+    Returns the sorted titles of the entries linking to the given entry.
+    '''
+    return list(Link.objects.filter(target=title).exclude(source=title)
+                .order_by('source').values_list('source', flat=True))
+
+
+def get_orphans(titles):
+    '''
+    Returns the titles, out of the given sorted titles, that no other
+    entry links to.
+    '''
+    linked = set(Link.objects.exclude(source=F('target')).values_list('target', flat=True))
+    return [title for title in titles if title not in linked]
+
+
+def get_wanted(exists):
+    '''
+    Returns pairs of a title that is linked to but does not exist,
+    according to the `exists` function, and the titles linking to it.
+    '''
+    found = {}
+    wanted = {}
+    for source, target in Link.objects.order_by('target', 'source').values_list('source', 'target'):
+        if target not in found:
+            found[target] = exists(target)
+        if not found[target]:
+            wanted.setdefault(target, []).append(source)
+    return list(wanted.items())
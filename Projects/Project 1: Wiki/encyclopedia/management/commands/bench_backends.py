@@ -0,0 +1,63 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from encyclopedia.backends import FileSystemBackend, SQLiteBackend, get_backend
+from encyclopedia.benchmarks import synthetic_corpus
+from encyclopedia.fulltext import InvertedIndex
+
+
+class Command(BaseCommand):
+    help = 'Compares the file system and SQLite entry backends on a synthetic corpus.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=10000,
+                            help='Number of synthetic entries.')
+        parser.add_argument('--operations', type=int, default=500,
+                            help='Number of reads and searches timed per backend.')
+
+    def time(self, function, repeat=1):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = function()
+        return (time.perf_counter() - start) / repeat, result
+
+    def handle(self, *args, **options):
+        corpus = list(synthetic_corpus(options['entries']))
+        rng = random.Random(0)
+        titles = [title for title, _ in rng.sample(corpus, min(options['operations'], len(corpus)))]
+        queries = [title.split()[0] for title in titles]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with override_settings(MEDIA_ROOT=tmp):
+                # the backend is cached, it would still be the one of the settings
+                get_backend.cache_clear()
+                os.makedirs(os.path.join(tmp, 'entries'))
+                backends = {
+                    'filesystem': FileSystemBackend(),
+                    'sqlite': SQLiteBackend(os.path.join(tmp, 'entries.sqlite3')),
+                }
+                fulltext = InvertedIndex(path=os.path.join(tmp, 'search_index.json'),
+                                         backend=backends['filesystem'])
+                results = {}
+                for name, backend in backends.items():
+                    write, _ = self.time(lambda: backend.write_many(corpus))
+                    listing, _ = self.time(backend.list_titles, repeat=5)
+                    read, _ = self.time(lambda: [backend.read(title) for title in titles])
+                    if backend.supports_search:
+                        search, _ = self.time(lambda: [backend.search(query) for query in queries])
+                    else:
+                        fulltext.rebuild()
+                        search, _ = self.time(lambda: [fulltext.search(query) for query in queries])
+                    results[name] = (write, listing, read / len(titles), search / len(queries))
+            get_backend.cache_clear()
+
+        self.stdout.write(f'{options["entries"]} entries')
+        self.stdout.write(f'{"backend":<12} {"write all s":>11} {"list ms":>9} {"read ms":>9} {"search ms":>10}')
+        for name, (write, listing, read, search) in results.items():
+            self.stdout.write(f'{name:<12} {write:>11.2f} {listing * 1000:>9.2f} '
+                              f'{read * 1000:>9.3f} {search * 1000:>10.3f}')
@@ -0,0 +1,49 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia.benchmarks import synthetic_titles
+from encyclopedia.titles import TrigramIndex
+
+
+class Command(BaseCommand):
+    help = 'Compares the trigram title index with a linear scan of the titles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,100000,1000000',
+                            help='Comma-separated numbers of titles to benchmark.')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Number of substring queries per size.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"titles":>10} {"build s":>9} {"scan ms":>9} {"trigram ms":>11} {"speedup":>8}')
+
+        for size in [int(size) for size in options['sizes'].split(',')]:
+            titles = synthetic_titles(size)
+            rng = random.Random(1)
+            queries = []
+            for title in rng.sample(titles, min(options['queries'], size)):
+                start = rng.randint(0, max(len(title) - 4, 0))
+                queries.append(title[start:start + 4].lower())
+
+            start = time.perf_counter()
+            index = TrigramIndex(titles)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            expected = [[title for title in titles if query in title.lower()] for query in queries]
+            scan = (time.perf_counter() - start) / len(queries)
+
+            start = time.perf_counter()
+            found = [index.search(query, titles) for query in queries]
+            trigram = (time.perf_counter() - start) / len(queries)
+
+            for query, found_titles, expected_titles in zip(queries, found, expected):
+                if found_titles != expected_titles:
+                    raise CommandError(
+                        f'The trigram index found {len(found_titles)} titles containing '
+                        f'"{query}" instead of {len(expected_titles)}.'
+                    )
+            self.stdout.write(f'{size:>10} {build:>9.2f} {scan * 1000:>9.3f} '
+                              f'{trigram * 1000:>11.3f} {scan / trigram:>7.1f}x')
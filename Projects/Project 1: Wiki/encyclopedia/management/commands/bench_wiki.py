@@ -0,0 +1,128 @@
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from encyclopedia import util
+from encyclopedia.backends import FileSystemBackend, get_backend
+from encyclopedia.benchmarks import synthetic_corpus
+from encyclopedia.fulltext import search_index
+from encyclopedia.rendering import render_cache
+from encyclopedia.titles import title_index
+
+
+def measure(function, arguments):
+    '''
+    Calls the function once per argument and returns the time of the
+    first (cold) call and statistics of the others in milliseconds.
+    '''
+    timings = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        timings.append((time.perf_counter() - start) * 1000)
+    cold, warm = timings[0], sorted(timings[1:]) or timings
+    return {
+        'cold_ms': round(cold, 4),
+        'mean_ms': round(statistics.mean(warm), 4),
+        'p50_ms': round(warm[len(warm) // 2], 4),
+        'p95_ms': round(warm[int(len(warm) * 0.95)], 4),
+        'calls': len(timings),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Times the encyclopedia on synthetic corpora of several sizes '
+            'and prints the results as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000',
+                            help='Comma-separated numbers of synthetic entries.')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Number of timed calls per operation.')
+        parser.add_argument('--output', help='File to write the JSON results to instead of stdout.')
+
+    def bench_size(self, size, repeat, tmp):
+        directory = os.path.join(tmp, str(size))
+        os.makedirs(os.path.join(directory, 'entries'))
+
+        with override_settings(
+            MEDIA_ROOT=directory,
+            WIKI_ENTRY_BACKEND='encyclopedia.backends.FileSystemBackend',
+            WIKI_ENTRY_BACKEND_OPTIONS={},
+            WIKI_SEARCH_INDEX_PATH=os.path.join(directory, 'search_index.json'),
+            WIKI_GENERATION_PATH=os.path.join(directory, '.wiki-generation'),
+        ):
+            start = time.perf_counter()
+            FileSystemBackend().write_many(synthetic_corpus(size))
+            generate = time.perf_counter() - start
+
+            # the backend is cached, it would still be the one of the settings
+            get_backend.cache_clear()
+            title_index.clear()
+            render_cache.clear()
+            search_index.clear()
+
+            rng = random.Random(size)
+            titles = rng.choices(sorted(os.path.splitext(name)[0] for name in
+                                        os.listdir(os.path.join(directory, 'entries'))), k=repeat)
+            queries = [title.split()[0][1:5] for title in titles]
+            words = [title.split()[-1].lower() for title in titles]
+            client = Client()
+
+            results = {
+                'generate_s': round(generate, 3),
+                'list_entries': measure(lambda _: util.list_entries(), titles),
+                'get_entry': measure(util.get_entry, titles),
+                'get_related_results': measure(util.get_related_results, queries),
+                'search_entries': measure(util.search_entries, words),
+                'entry_page': measure(lambda title: client.get(f'/wiki/{title}'), titles),
+                'search': measure(lambda query: client.post('/search', {'title': query}), queries),
+                'random_page': measure(lambda _: client.get('/random'), titles),
+            }
+
+            title_index.clear()
+            render_cache.clear()
+            search_index.clear()
+        get_backend.cache_clear()
+        return results
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'platform': platform.platform(),
+            },
+            'repeat': options['repeat'],
+            'sizes': {},
+        }
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                for size in sizes:
+                    self.stderr.write(f'Benchmarking {size} entries...')
+                    report['sizes'][size] = self.bench_size(size, options['repeat'], tmp)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            sys.stdout.write(output + '\n')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import util
+
+
+class Command(BaseCommand):
+    help = 'Computes the metadata of the encyclopedia entries that is missing or out of date.'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        titles = util.list_entries()
+        for title in titles:
+            content = util.get_entry(title)
+            if content is not None:
+                util.get_metadata(title, content)
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked the metadata of {len(titles)} entries '
+            f'in {time.perf_counter() - start:.2f}s.'
+        ))
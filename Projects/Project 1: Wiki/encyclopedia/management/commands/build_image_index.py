@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import images, util
+
+
+class Command(BaseCommand):
+    help = ('Measures the new and changed images of the images directory, makes their '
+            'thumbnails and rebuilds the references to them from the encyclopedia entries.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        indexed = images.index_images()
+        titles = util.list_entries()
+        images.rebuild_references((title, util.get_entry(title)) for title in titles)
+        util.generation.bump()
+        if images.PILImage is None:
+            self.stdout.write(self.style.WARNING('Pillow is not installed, no thumbnails were made.'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} images and the references of {len(titles)} entries '
+            f'in {time.perf_counter() - start:.2f}s.'
+        ))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import links, util
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the graph of links between the encyclopedia entries.'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        titles = util.list_entries()
+        links.rebuild((title, util.get_entry(title)) for title in titles)
+        self.stdout.write(self.style.SUCCESS(
+            f'Extracted the links of {len(titles)} entries '
+            f'in {time.perf_counter() - start:.2f}s.'
+        ))
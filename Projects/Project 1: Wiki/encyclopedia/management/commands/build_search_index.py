@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia.fulltext import search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of the encyclopedia entries.'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        search_index.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(search_index.docs)} entries '
+            f'in {time.perf_counter() - start:.2f}s.'
+        ))
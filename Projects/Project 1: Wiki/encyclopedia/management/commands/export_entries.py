@@ -0,0 +1,45 @@
+import io
+import sys
+import tarfile
+import time
+import zipfile
+
+from django.core.management.base import BaseCommand
+
+from encyclopedia import util
+
+
+class Command(BaseCommand):
+    help = ('Writes all encyclopedia entries into a single compressed archive, '
+            'a .zip file or else a gzipped tar stream.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='Path of the archive, or - for a tar.gz stream on stdout.')
+
+    def handle(self, *args, **options):
+        path = options['archive']
+        titles = util.list_entries()
+
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for title in titles:
+                    stat = util.get_entry_stat(title)
+                    info = zipfile.ZipInfo(f'entries/{title}.md', time.gmtime(stat.mtime_ns // 10 ** 9)[:6])
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    archive.writestr(info, util.get_entry(title))
+        else:
+            fileobj = sys.stdout.buffer if path == '-' else open(path, 'wb')
+            try:
+                # a stream mode, the archive is never held in memory or seeked
+                with tarfile.open(fileobj=fileobj, mode='w|gz') as archive:
+                    for title in titles:
+                        data = util.get_entry(title).encode('utf-8')
+                        info = tarfile.TarInfo(f'entries/{title}.md')
+                        info.size = len(data)
+                        info.mtime = util.get_entry_stat(title).mtime_ns // 10 ** 9
+                        archive.addfile(info, io.BytesIO(data))
+            finally:
+                if fileobj is not sys.stdout.buffer:
+                    fileobj.close()
+
+        self.stderr.write(self.style.SUCCESS(f'Exported {len(titles)} entries.'))
@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.http import HttpRequest
+from django.template.loader import render_to_string
+
+from encyclopedia import util
+from encyclopedia.rendering import content_hash
+
+
+MANIFEST = '.export-manifest.json'
+
+SUMMARY_BATCH_SIZE = 500
+
+
+def init_worker():
+    # a no-op in forked workers, sets Django up in spawned ones
+    django.setup()
+    # forked workers must not share the database connection of the parent
+    connections.close_all()
+
+
+def export_entry(title, output, previous_hash):
+    '''
+    Renders one entry to `output/wiki/TITLE.html` unless the hash of its
+    source and backlinks equals `previous_hash`. Returns the title, the new hash and whether
+    the entry was rendered.
+    '''
+    from encyclopedia.views import entry_page_context
+
+    entry_markdown = util.get_entry(title)
+    if entry_markdown is None:
+        return title, None, False
+
+    # the page also lists the entries linking to it
+    entry_hash = content_hash('\n'.join([entry_markdown] + util.get_backlinks(title)))
+    path = os.path.join(output, 'wiki', f'{title}.html')
+    if entry_hash == previous_hash and os.path.exists(path):
+        return title, entry_hash, False
+
+    html = render_to_string('encyclopedia/entry_page.html',
+                            entry_page_context(title, entry_markdown), request=HttpRequest())
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    os.replace(tmp_path, path)
+    return title, entry_hash, True
+
+
+class Command(BaseCommand):
+    help = 'Renders every encyclopedia entry to a static HTML file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory to write the HTML files into.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of rendering processes, 1 to render in this process.')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only render entries whose source changed since the last export.')
+        parser.add_argument('--chunksize', type=int, default=64,
+                            help='Number of entries sent to a worker at a time.')
+
+    def handle(self, *args, **options):
+        from encyclopedia.views import SearchForm
+
+        output = options['output']
+        os.makedirs(os.path.join(output, 'wiki'), exist_ok=True)
+        manifest_path = os.path.join(output, MANIFEST)
+
+        manifest = {}
+        if options['incremental']:
+            try:
+                with open(manifest_path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except FileNotFoundError:
+                pass
+
+        titles = util.list_entries()
+        start = time.perf_counter()
+        rendered = 0
+        new_manifest = {}
+
+        arguments = (titles, [output] * len(titles), [manifest.get(title) for title in titles])
+        if options['workers'] > 1:
+            # the workers only read the metadata, concurrent writes of
+            # missing or stale rows would fail with a locked database
+            call_command('build_entry_metadata', stdout=self.stdout)
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker)
+            results = executor.map(export_entry, *arguments, chunksize=options['chunksize'])
+        else:
+            # a single worker renders the entries in this process
+            executor = None
+            results = map(export_entry, *arguments)
+        try:
+            for title, entry_hash, was_rendered in results:
+                if entry_hash is not None:
+                    new_manifest[title] = entry_hash
+                rendered += was_rendered
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # remove the pages of entries deleted since the last export
+        for title in set(manifest) - set(new_manifest):
+            try:
+                os.remove(os.path.join(output, 'wiki', f'{title}.html'))
+            except FileNotFoundError:
+                pass
+
+        summaries = {}
+        # in batches, keeping the queries within the parameter limit of SQLite
+        for i in range(0, len(titles), SUMMARY_BATCH_SIZE):
+            summaries.update(util.get_summaries(titles[i:i + SUMMARY_BATCH_SIZE]))
+        index = render_to_string('encyclopedia/index.html', {
+            'entries': [(title, summaries.get(title, '')) for title in titles],
+            'search': SearchForm()
+        }, request=HttpRequest())
+        with open(os.path.join(output, 'index.html'), 'w', encoding='utf-8') as f:
+            f.write(index)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(new_manifest, f)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {len(new_manifest)} entries to {output}: '
+            f'{rendered} rendered, {len(new_manifest) - rendered} unchanged '
+            f'in {elapsed:.2f}s ({rendered / elapsed if elapsed else 0:.0f} entries/s).'
+        ))
@@ -0,0 +1,65 @@
+import os
+import sys
+import tarfile
+import time
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia import util
+
+
+def read_archive(path):
+    '''
+    Yields pairs of a title and Markdown content from the .md files of
+    a zip archive or a (compressed) tar archive, - meaning stdin.
+    '''
+    if path != '-' and zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if name.endswith('.md'):
+                    yield os.path.basename(name)[:-3], archive.read(name).decode('utf-8')
+        return
+
+    fileobj = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    try:
+        with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith('.md'):
+                    content = archive.extractfile(member).read().decode('utf-8')
+                    yield os.path.basename(member.name)[:-3], content
+    finally:
+        if fileobj is not sys.stdin.buffer:
+            fileobj.close()
+
+
+class Command(BaseCommand):
+    help = ('Imports the encyclopedia entries of an archive written by export_entries, '
+            'skipping the entries whose content is unchanged.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='Path of a .zip or tar archive, or - for a tar stream on stdin.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of threads writing the entries.')
+
+    def handle(self, *args, **options):
+        if options['archive'] != '-' and not os.path.isfile(options['archive']):
+            raise CommandError(f'The archive {options["archive"]} does not exist.')
+        start = time.perf_counter()
+        total = 0
+
+        def entries():
+            nonlocal total
+            for entry in read_archive(options['archive']):
+                total += 1
+                yield entry
+
+        try:
+            written = util.save_entries(entries(), workers=options['workers'])
+        except (tarfile.TarError, zipfile.BadZipFile, UnicodeDecodeError) as e:
+            raise CommandError(f'Could not read the archive: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(written)} of {total} entries, {total - len(written)} unchanged, '
+            f'in {time.perf_counter() - start:.2f}s.'
+        ))
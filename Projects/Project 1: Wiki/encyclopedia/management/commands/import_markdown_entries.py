@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from encyclopedia.backends import FileSystemBackend, get_backend
+from encyclopedia.titles import title_index
+
+
+class Command(BaseCommand):
+    help = 'Imports the Markdown files of the entries directory into the configured entry backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default='entries',
+                            help='Directory of the default storage holding the .md files.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of entries written per transaction.')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if isinstance(backend, FileSystemBackend):
+            raise CommandError('The configured entry backend already reads the Markdown files.')
+
+        source = FileSystemBackend(options['directory'])
+        titles = source.list_titles()
+        batch = []
+        for title in titles:
+            batch.append((title, source.read(title)))
+            if len(batch) == options['batch_size']:
+                backend.write_many(batch)
+                batch = []
+        if batch:
+            backend.write_many(batch)
+        title_index.clear()
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {len(titles)} entries.'))
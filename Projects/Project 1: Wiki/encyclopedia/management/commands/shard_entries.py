@@ -0,0 +1,50 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from encyclopedia.backends import shard
+from encyclopedia.titles import title_index
+
+
+class Command(BaseCommand):
+    help = ('Moves the Markdown files of a flat entries directory into the sharded '
+            'layout in place, or back with --flatten.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default='entries',
+                            help='Directory of the default storage holding the entries.')
+        parser.add_argument('--flatten', action='store_true',
+                            help='Move the files of a sharded directory back into a flat one.')
+
+    def handle(self, *args, **options):
+        root = default_storage.path(options['directory'])
+        moved = 0
+
+        if not options['flatten']:
+            with os.scandir(root) as it:
+                files = [entry.name for entry in it
+                         if entry.name.endswith('.md') and entry.is_file()]
+            for filename in files:
+                directory = os.path.join(root, shard(filename[:-3]))
+                os.makedirs(directory, exist_ok=True)
+                os.replace(os.path.join(root, filename), os.path.join(directory, filename))
+                moved += 1
+        else:
+            for directory, _, filenames in os.walk(root, topdown=False):
+                if directory == root:
+                    continue
+                for filename in filenames:
+                    if filename.endswith('.md'):
+                        os.replace(os.path.join(directory, filename), os.path.join(root, filename))
+                        moved += 1
+                if not os.listdir(directory):
+                    os.rmdir(directory)
+
+        os.utime(root)
+        title_index.clear()
+        layout = 'flat' if options['flatten'] else 'sharded'
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} entries into the {layout} layout. '
+            f'Set WIKI_ENTRY_BACKEND_OPTIONS = {{"sharded": {not options["flatten"]}}} to match.'
+        ))
@@ -0,0 +1,135 @@
+import html
+import json
+import re
+from datetime import datetime, timezone
+
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+from .fulltext import TOKEN_RE, tokenize
+from .models import EntryMetadata
+from .rendering import content_hash
+
+
+HEADING_RE = re.compile(r'<h([1-6]) id="([^"]*)">(.*?)</h\1>', re.DOTALL)
+PARAGRAPH_RE = re.compile(r'<p>(.*?)</p>', re.DOTALL)
+
+# bump whenever compute() changes, stored rows of older versions are recomputed
+VERSION = 2
+
+SUMMARY_LENGTH = 300
+SNIPPET_LENGTH = 200
+# the number of occurrences of each word whose offsets are kept
+MAX_POSITIONS = 8
+
+
+def compute(content, entry_html):
+    '''
+    Returns the metadata of an entry derived from its Markdown content
+    and its rendered HTML: the content hash, the number of words, the
+    headings, the first paragraph as a plain-text summary, and the plain
+    text with the offsets of the first occurrences of each word.
+    '''
+    toc = [[int(level), id, html.unescape(strip_tags(text)).strip()]
+           for level, id, text in HEADING_RE.findall(entry_html)]
+
+    summary = ''
+    paragraph = PARAGRAPH_RE.search(entry_html)
+    if paragraph is not None:
+        summary = ' '.join(html.unescape(strip_tags(paragraph.group(1))).split())
+        if len(summary) > SUMMARY_LENGTH:
+            summary = summary[:SUMMARY_LENGTH - 1].rsplit(' ', 1)[0] + '…'
+
+    text = ' '.join(html.unescape(strip_tags(entry_html)).split())
+    positions = {}
+    word_count = 0
+    for match in TOKEN_RE.finditer(text):
+        word_count += 1
+        offsets = positions.setdefault(match.group().lower(), [])
+        if len(offsets) < MAX_POSITIONS:
+            offsets.append(match.start())
+
+    return {
+        'content_hash': content_hash(content),
+        'word_count': word_count,
+        'toc': json.dumps(toc, separators=(',', ':')),
+        'summary': summary,
+        'text': text,
+        'positions': json.dumps(positions, separators=(',', ':'), ensure_ascii=False),
+        'version': VERSION,
+    }
+
+
+def update(title, content, entry_html, mtime_ns):
+    '''
+    Stores the metadata of an entry after it has been saved or found
+    to be out of date, and returns it.
+    '''
+    metadata, _ = EntryMetadata.objects.update_or_create(title=title, defaults=dict(
+        compute(content, entry_html),
+        date_modified=datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc)
+    ))
+    return metadata
+
+
+def get(title):
+    return EntryMetadata.objects.filter(title=title).first()
+
+
+def get_summaries(titles):
+    '''
+    Returns the summaries of the given entries keyed by title,
+    with a single query.
+    '''
+    return dict(EntryMetadata.objects.filter(title__in=titles).values_list('title', 'summary'))
+
+
+def _snippet(text, positions, terms):
+    # the offsets of the query words, then the window holding most of them
+    offsets = sorted(offset for term in terms for offset in positions.get(term, ()))
+    if not offsets:
+        return None
+    best, best_count, first = offsets[0], 0, 0
+    for last, offset in enumerate(offsets):
+        while offset - offsets[first] > SNIPPET_LENGTH // 2:
+            first += 1
+        if last - first + 1 > best_count:
+            best, best_count = offsets[first], last - first + 1
+
+    start = max(0, best - SNIPPET_LENGTH // 4)
+    if start > 0:
+        space = text.find(' ', start, best)
+        start = space + 1 if space != -1 else best
+    end = min(len(text), start + SNIPPET_LENGTH)
+    if end < len(text):
+        space = text.rfind(' ', start, end)
+        end = space if space > best else end
+
+    # only the snippet itself is scanned for the words to highlight
+    parts = ['…'] if start > 0 else []
+    cursor = start
+    for match in TOKEN_RE.finditer(text, start, end):
+        if match.group().lower() in terms:
+            parts.append(escape(text[cursor:match.start()]))
+            parts.append(f'<mark>{escape(match.group())}</mark>')
+            cursor = match.end()
+    parts.append(escape(text[cursor:end]))
+    if end < len(text):
+        parts.append('…')
+    return mark_safe(''.join(parts))
+
+
+def get_snippets(titles, query):
+    '''
+    Returns an HTML snippet of each of the given entries keyed by title:
+    the passage with most of the words of the query, highlighted, or
+    the summary if the entry does not contain any of them. The passage is
+    found with the stored word offsets, so no entry is read or scanned.
+    '''
+    terms = set(tokenize(query))
+    snippets = {}
+    for title, text, positions, summary in EntryMetadata.objects.filter(
+            title__in=titles, version=VERSION).values_list('title', 'text', 'positions', 'summary'):
+        snippet = _snippet(text, json.loads(positions), terms) if terms else None
+        snippets[title] = snippet if snippet is not None else summary
+    return snippets
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0002_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryMetadata',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100, unique=True)),
+                ('content_hash', models.CharField(max_length=40)),
+                ('word_count', models.PositiveIntegerField()),
+                ('toc', models.TextField()),
+                ('summary', models.CharField(max_length=300)),
+                ('date_modified', models.DateTimeField()),
+            ],
+        ),
+    ]
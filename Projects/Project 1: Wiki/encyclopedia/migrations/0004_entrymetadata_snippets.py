@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0003_entrymetadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrymetadata',
+            name='positions',
+            field=models.TextField(default='{}'),
+        ),
+        migrations.AddField(
+            model_name='entrymetadata',
+            name='text',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='entrymetadata',
+            name='version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('encyclopedia', '0004_entrymetadata_snippets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Image',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('width', models.PositiveIntegerField(null=True)),
+                ('height', models.PositiveIntegerField(null=True)),
+                ('size', models.PositiveIntegerField()),
+                ('mtime_ns', models.BigIntegerField()),
+                ('thumbnail', models.BinaryField(default=b'')),
+                ('thumbnail_type', models.CharField(blank=True, max_length=20)),
+                ('thumbnail_width', models.PositiveIntegerField(null=True)),
+                ('thumbnail_height', models.PositiveIntegerField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImageReference',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, max_length=100)),
+                ('image', models.CharField(db_index=True, max_length=255)),
+                ('text', models.TextField()),
+            ],
+            options={
+                'unique_together': {('source', 'image')},
+            },
+        ),
+    ]
@@ -1,3 +1,90 @@
+import json
+
 from django.db import models
+from django.utils import timezone
+
+
+class Revision(models.Model):
+    title = models.CharField(max_length=100)
+    number = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=40)
+    # a full copy of the content, otherwise a delta against the previous revision
+    snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()
+    date_created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [['title', 'number']]
+
+    def get_creation_date(self):
+        return self.date_created.strftime('%B %d %Y, %H:%M')
+
+    def __str__(self):
+        return f'Revision #{self.number} of {self.title}'
+
+
+class Link(models.Model):
+    source = models.CharField(max_length=100, db_index=True)
+    target = models.CharField(max_length=100, db_index=True)
+
+    class Meta:
+        unique_together = [['source', 'target']]
+
+    def __str__(self):
+        return f'{self.source} -> {self.target}'
+
+
+class EntryMetadata(models.Model):
+    title = models.CharField(max_length=100, unique=True)
+    content_hash = models.CharField(max_length=40)
+    word_count = models.PositiveIntegerField()
+    # a JSON list of [level, id, text] for each heading
+    toc = models.TextField()
+    summary = models.CharField(max_length=300)
+    date_modified = models.DateTimeField()
+    # the plain text of the entry and, as JSON, the offsets in it of
+    # the first occurrences of each word, to build search snippets
+    text = models.TextField(default='')
+    positions = models.TextField(default='{}')
+    # the version of encyclopedia.metadata that computed the row
+    version = models.PositiveSmallIntegerField(default=1)
+
+    def get_modification_date(self):
+        return self.date_modified.strftime('%B %d %Y, %H:%M')
+
+    def get_toc(self):
+        return [{'level': level, 'id': id, 'text': text} for level, id, text in json.loads(self.toc)]
+
+    def __str__(self):
+        return f'Metadata of {self.title}'
+
+
+class Image(models.Model):
+    # relative to the images directory of the default storage
+    path = models.CharField(max_length=255, unique=True)
+    width = models.PositiveIntegerField(null=True)
+    height = models.PositiveIntegerField(null=True)
+    size = models.PositiveIntegerField()
+    mtime_ns = models.BigIntegerField()
+    # a scaled down copy, empty if it could not be made
+    thumbnail = models.BinaryField(default=b'')
+    thumbnail_type = models.CharField(max_length=20, blank=True)
+    thumbnail_width = models.PositiveIntegerField(null=True)
+    thumbnail_height = models.PositiveIntegerField(null=True)
+
+    def __str__(self):
+        return self.path
+
+
+class ImageReference(models.Model):
+    source = models.CharField(max_length=100, db_index=True)
+    image = models.CharField(max_length=255, db_index=True)
+    # the alt text and caption given to the image by the entry
+    text = models.TextField()
+
+    class Meta:
+        unique_together = [['source', 'image']]
 
-# Create your models here.
+    def __str__(self):
+        return f'{self.source} -> {self.image}'
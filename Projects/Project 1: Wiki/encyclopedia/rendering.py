@@ -0,0 +1,116 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from markdown2 import Markdown
+
+
+def content_hash(content):
+    '''
+    Returns the hex digest identifying a version of an entry's Markdown content.
+    '''
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def render_markdown(content):
+    '''
+    Converts Markdown content to HTML without any caching. Headings get
+    ids so that the table of contents of an entry can link to them.
+    '''
+    return Markdown(extras=['header-ids']).convert(content)
+
+
+class RenderCache:
+    '''
+    A cache of rendered entry HTML keyed by the entry's title and
+    the hash of its Markdown content.
+
+    Rendered pages are kept in a bounded in-process LRU. When
+    `WIKI_RENDER_CACHE_ALIAS` names one of the configured Django caches,
+    that cache is consulted on a local miss and filled after rendering,
+    so other processes can reuse the work. Because the key includes the
+    content hash, a stale page is never served even if the entry is
+    changed by another process.
+    '''
+
+    def __init__(self, max_size=None, alias=None):
+        self.max_size = max_size
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+
+    def _max_size(self):
+        if self.max_size is not None:
+            return self.max_size
+        return getattr(settings, 'WIKI_RENDER_CACHE_SIZE', 256)
+
+    def _shared_cache(self):
+        alias = self.alias or getattr(settings, 'WIKI_RENDER_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    def render(self, title, content):
+        '''
+        Returns the HTML for the given version of an entry, rendering
+        it only if no cached copy exists.
+        '''
+        key = (title, content_hash(content))
+
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        shared = self._shared_cache()
+        # bump the version whenever render_markdown changes its output
+        shared_key = f'encyclopedia:html:2:{key[1]}'
+        html = shared.get(shared_key) if shared is not None else None
+        if html is not None:
+            with self._lock:
+                self.shared_hits += 1
+        else:
+            html = render_markdown(content)
+            if shared is not None:
+                shared.set(shared_key, html)
+
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size():
+                self._entries.popitem(last=False)
+        return html
+
+    def invalidate(self, title):
+        '''
+        Drops every cached version of the entry with the given title.
+        '''
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == title]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        '''
+        Returns the cache counters for monitoring.
+        '''
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self._max_size(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared_hits': self.shared_hits,
+            }
+
+
+render_cache = RenderCache()
@@ -0,0 +1,119 @@
+import difflib
+import json
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Revision
+from .rendering import content_hash
+
+
+def encode_delta(previous, content):
+    '''
+    Returns a compact description of how to build `content` from
+    `previous`: runs of lines copied from the previous version and
+    the lines inserted between them.
+    '''
+    previous_lines = previous.splitlines(keepends=True)
+    lines = content.splitlines(keepends=True)
+    operations = []
+    matcher = difflib.SequenceMatcher(None, previous_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            operations.append([i1, i2])
+        elif j1 != j2:
+            operations.append(lines[j1:j2])
+    return operations
+
+
+def apply_delta(previous, operations):
+    '''
+    Rebuilds a version of an entry from the previous version and a delta.
+    '''
+    previous_lines = previous.splitlines(keepends=True)
+    lines = []
+    for operation in operations:
+        if len(operation) == 2 and isinstance(operation[0], int):
+            lines.extend(previous_lines[operation[0]:operation[1]])
+        else:
+            lines.extend(operation)
+    return ''.join(lines)
+
+
+def _add(title, number, content, previous=None):
+    interval = getattr(settings, 'WIKI_REVISION_SNAPSHOT_INTERVAL', 20)
+    snapshot = previous is None or number % interval == 1
+    if snapshot:
+        data = content
+    else:
+        data = json.dumps(encode_delta(previous, content), separators=(',', ':'))
+    return Revision.objects.create(
+        title=title,
+        number=number,
+        content_hash=content_hash(content),
+        snapshot=snapshot,
+        data=zlib.compress(data.encode('utf-8')),
+        size=len(content.encode('utf-8'))
+    )
+
+
+def latest_revision(title):
+    return Revision.objects.filter(title=title).order_by('-number').first()
+
+
+def record(title, previous, content):
+    '''
+    Records a new revision of an entry, given the content it is about to
+    replace (None for a new entry). Returns the revision, or None if the
+    content is identical to the previous one and nothing was recorded.
+
+    Every `WIKI_REVISION_SNAPSHOT_INTERVAL`-th revision stores the full
+    content, the others only a delta against their predecessor, so
+    rebuilding any revision applies a bounded number of deltas.
+    '''
+    with transaction.atomic():
+        latest = latest_revision(title)
+        number = latest.number if latest is not None else 0
+        if previous is not None:
+            previous_hash = content_hash(previous)
+            if previous_hash == content_hash(content):
+                return None
+            if latest is None or latest.content_hash != previous_hash:
+                # the entry existed before its history, or was changed
+                # outside of the application: keep that version too
+                number += 1
+                _add(title, number, previous)
+        return _add(title, number + 1, content, previous)
+
+
+def get_revisions(title):
+    '''
+    Returns the revisions of an entry, newest first, without their data.
+    '''
+    return Revision.objects.filter(title=title).defer('data').order_by('-number')
+
+
+def get_content(title, number):
+    '''
+    Rebuilds the content of an entry as of the given revision,
+    or returns None if there is no such revision.
+    '''
+    revisions = list(Revision.objects.filter(
+        title=title,
+        number__lte=number,
+        number__gte=Revision.objects.filter(
+            title=title, number__lte=number, snapshot=True
+        ).order_by('-number').values('number')[:1]
+    ).order_by('number'))
+    if not revisions or revisions[-1].number != number:
+        return None
+
+    content = None
+    for revision in revisions:
+        data = zlib.decompress(revision.data).decode('utf-8')
+        if revision.snapshot:
+            content = data
+        else:
+            content = apply_delta(content, json.loads(data))
+    return content
@@ -0,0 +1,60 @@
+document.addEventListener('DOMContentLoaded', function() {
+
+  // Autocomplete the search box in the sidebar with matching titles
+  const form = document.querySelector('form[data-suggest-url]');
+  if (form === null) {
+    return;
+  }
+  const input = form.querySelector('input[name="title"]');
+  const datalist = form.querySelector('#search-suggestions');
+  input.setAttribute('list', datalist.id);
+  input.setAttribute('autocomplete', 'off');
+
+  let timer = null;
+  let controller = null;
+
+  input.addEventListener('input', () => {
+    clearTimeout(timer);
+    timer = setTimeout(() => load_suggestions(input.value.trim()), 100);
+  });
+
+  // Picking a suggestion opens its page directly
+  input.addEventListener('change', () => {
+    const option = datalist.querySelector(`option[value="${CSS.escape(input.value)}"]`);
+    if (option !== null) {
+      window.location.href = `/wiki/${encodeURIComponent(input.value)}`;
+    }
+  });
+
+
+  /**
+   * GET /search/suggest?q=<str:query>
+   * @param query
+   */
+  function load_suggestions(query) {
+    if (controller !== null) {
+      controller.abort();
+    }
+    if (query === '') {
+      datalist.innerHTML = '';
+      return;
+    }
+    controller = new AbortController();
+
+    fetch(`${form.dataset.suggestUrl}?q=${encodeURIComponent(query)}`, { signal: controller.signal })
+    .then(response => response.json())
+    .then(data => {
+      datalist.innerHTML = '';
+      data.results.forEach(title => {
+        const option = document.createElement('option');
+        option.value = title;
+        datalist.append(option);
+      });
+    })
+    .catch(error => {
+      if (error.name !== 'AbortError') {
+        console.log(error);
+      }
+    });
+  }
+});
@@ -1,3 +1,906 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import struct
+import tarfile
+import tempfile
+import time
+import warnings
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.http import http_date
+
+from . import images, revisions, util
+from .backends import get_backend, shard
+from .coherence import Generation
+from .fulltext import InvertedIndex, Query, parse_query, search_index
+from .images import image_index
+from .models import Image
+from .rendering import RenderCache, render_cache
+from .titles import DeletionIndex, TrigramIndex, edit_distance, title_index
+
+
+class WikiTestMixin:
+    '''
+    Runs each test against its own entries directory and indexes
+    in a temporary directory, starting with no entries.
+    '''
+
+    backend = 'encyclopedia.backends.FileSystemBackend'
+
+    def backend_options(self):
+        return {}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        os.makedirs(os.path.join(self.directory, 'entries'))
+        overridden = override_settings(
+            MEDIA_ROOT=self.directory,
+            WIKI_ENTRY_BACKEND=self.backend,
+            WIKI_ENTRY_BACKEND_OPTIONS=self.backend_options(),
+            WIKI_SEARCH_INDEX_PATH=os.path.join(self.directory, 'search_index.json'),
+            WIKI_GENERATION_PATH=os.path.join(self.directory, '.wiki-generation'),
+        )
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.reset_caches()
+        self.addCleanup(self.reset_caches)
+
+    def reset_caches(self):
+        get_backend.cache_clear()
+        title_index.clear()
+        search_index.clear()
+        render_cache.clear()
+        image_index.clear()
+
+    def write_file(self, title, content):
+        # an entry changed outside of the application
+        with open(os.path.join(self.directory, 'entries', f'{title}.md'), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+class WikiTestCase(WikiTestMixin, TestCase):
+    pass
+
+
+class WikiTransactionTestCase(WikiTestMixin, TransactionTestCase):
+    '''
+    Commits the changes of each test, for tests that read the database
+    from other processes.
+    '''
+
+
+class TitleIndexTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        util.save_entries([('Python', 'A language.'), ('Django', 'A framework.')])
+
+    def test_find_entry_ignores_case(self):
+        self.assertEqual(util.find_entry('python'), 'Python')
+        self.assertEqual(util.find_entry('DJANGO'), 'Django')
+        self.assertIsNone(util.find_entry('Flask'))
+
+    def test_files_added_and_removed_outside_of_the_application(self):
+        self.assertEqual(util.list_entries(), ['Django', 'Python'])
+        self.write_file('Flask', 'Another framework.')
+        # the version of the backend changed, the titles are listed again
+        self.assertEqual(util.list_entries(), ['Django', 'Flask', 'Python'])
+        self.assertEqual(util.find_entry('flask'), 'Flask')
+
+        os.remove(os.path.join(self.directory, 'entries', 'Python.md'))
+        self.assertEqual(util.list_entries(), ['Django', 'Flask'])
+        self.assertIsNone(util.find_entry('Python'))
+
+    def test_titles_are_not_listed_while_unchanged(self):
+        util.list_entries()
+        with mock.patch.object(get_backend(), 'list_titles') as list_titles:
+            util.list_entries()
+            util.find_entry('python')
+        list_titles.assert_not_called()
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+})
+class RenderCacheTests(WikiTestCase):
+
+    def test_lru_bound(self):
+        cache = RenderCache(max_size=2)
+        cache.render('Alpha', '# Alpha')
+        cache.render('Beta', '# Beta')
+        cache.render('Alpha', '# Alpha')
+        cache.render('Gamma', '# Gamma')
+        # Beta was the least recently used
+        self.assertEqual(cache.stats()['size'], 2)
+        cache.render('Alpha', '# Alpha')
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        cache.render('Beta', '# Beta')
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_save_entry_invalidates(self):
+        util.save_entry('Alpha', 'first version')
+        util.render_entry('Alpha', 'first version')
+        util.save_entry('Alpha', 'second version')
+        # the page of the replaced version was dropped
+        misses = render_cache.misses
+        self.assertIn('first version', util.render_entry('Alpha', 'first version'))
+        self.assertEqual(render_cache.misses, misses + 1)
+
+    def test_shared_cache(self):
+        first, second = RenderCache(alias='shared'), RenderCache(alias='shared')
+        html = first.render('Alpha', '# Alpha')
+        with mock.patch('encyclopedia.rendering.render_markdown') as render_markdown:
+            self.assertEqual(second.render('Alpha', '# Alpha'), html)
+        # rendered by the other process
+        render_markdown.assert_not_called()
+        self.assertEqual((second.misses, second.shared_hits), (1, 1))
+
+    def test_stats_view(self):
+        util.save_entry('Alpha', 'content')
+        render_cache.clear()
+        before = self.client.get('/stats').json()['render_cache']
+        self.client.get('/wiki/Alpha')
+        self.client.get('/wiki/Alpha')
+        after = self.client.get('/stats').json()['render_cache']
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['size'], 1)
+
+
+class FullTextIndexTests(WikiTestCase):
+
+    def journal_lines(self):
+        try:
+            with open(search_index._journal_path(), encoding='utf-8') as f:
+                return len(f.readlines())
+        except FileNotFoundError:
+            return 0
+
+    def test_bm25_ranking(self):
+        util.save_entry('Alpha', 'apple apple apple banana')
+        util.save_entry('Beta', 'apple banana banana cherry')
+        util.save_entry('Cherry', 'a red fruit')
+        self.assertEqual(search_index.search('apple'), ['Alpha', 'Beta'])
+        self.assertEqual(search_index.search('banana'), ['Beta', 'Alpha'])
+        # the title weighs more than a word of the body
+        self.assertEqual(search_index.search('cherry'), ['Cherry', 'Beta'])
+        self.assertEqual(search_index.search('durian'), [])
+
+    def test_journal_replay(self):
+        util.save_entry('Alpha', 'apple banana')
+        util.save_entry('Beta', 'banana cherry')
+        util.save_entry('Alpha', 'apple durian')
+        self.assertEqual(self.journal_lines(), 3)
+
+        index = InvertedIndex()
+        self.assertEqual(index.search('durian'), ['Alpha'])
+        self.assertEqual(index.search('banana'), ['Beta'])
+        # replayed from the journal, no entry was indexed again
+        self.assertEqual(self.journal_lines(), 3)
+
+    def test_changes_outside_of_the_application(self):
+        util.save_entry('Alpha', 'apple banana')
+        self.write_file('Alpha', 'cherry')
+        self.write_file('Beta', 'cherry banana')
+
+        index = InvertedIndex()
+        self.assertEqual(index.search('cherry'), ['Alpha', 'Beta'])
+        self.assertEqual(index.search('apple'), [])
+
+    @override_settings(WIKI_SEARCH_JOURNAL_LIMIT=2)
+    def test_compaction(self):
+        search_index.search('apple')
+        util.save_entry('Alpha', 'apple')
+        util.save_entry('Beta', 'banana')
+        util.save_entry('Gamma', 'cherry')
+        # the journal was folded into a new snapshot
+        self.assertTrue(os.path.exists(search_index._path()))
+        self.assertEqual(self.journal_lines(), 0)
+
+        index = InvertedIndex()
+        self.assertEqual(sorted(index.search('apple banana cherry')), ['Alpha', 'Beta', 'Gamma'])
+
+    def test_phrases(self):
+        util.save_entry('Web', 'a python web framework')
+        self.assertEqual(search_index.query(parse_query('"web framework"')), ['Web'])
+        self.assertEqual(search_index.query(parse_query('"framework web"')), [])
+        # no phrase spans the title and the body
+        self.assertEqual(search_index.query(parse_query('"web a"')), [])
+
+    def test_phrases_of_repeated_words(self):
+        util.save_entry('Chant', 'go team go go')
+        self.assertEqual(search_index.query(parse_query('"go go"')), ['Chant'])
+        self.assertEqual(search_index.query(parse_query('"team go go"')), ['Chant'])
+        self.assertEqual(search_index.query(parse_query('"team team"')), [])
+
+    @override_settings(WIKI_SEARCH_JOURNAL_LIMIT=0)
+    def test_phrases_from_the_snapshot(self):
+        search_index.search('web')
+        util.save_entry('Web', 'a python web framework, a web server')
+        self.assertEqual(self.journal_lines(), 0)
+
+        # the offsets are read back from the snapshot
+        index = InvertedIndex()
+        self.assertEqual(index.query(parse_query('"web server"')), ['Web'])
+        self.assertEqual(index.query(parse_query('"python web framework"')), ['Web'])
+        self.assertEqual(index.query(parse_query('"server web"')), [])
+
+
+class TrigramIndexTests(TestCase):
+
+    titles = sorted(['Python', 'Django', 'Flask', 'CPython', 'Jython', 'HTML', 'pythonic'])
+
+    def test_matches_a_scan(self):
+        index = TrigramIndex(self.titles)
+        for query in ['python', 'PYTH', 'jan', 'thon', 'ask', 'xyz', 'ml']:
+            self.assertEqual(index.search(query, self.titles),
+                             [title for title in self.titles if query.lower() in title.lower()])
+
+    def test_add(self):
+        index = TrigramIndex(self.titles)
+        index.add('Monty Python')
+        self.assertEqual(index.search('y py', self.titles + ['Monty Python']), ['Monty Python'])
+
+
+class RelatedResultsTests(WikiTestCase):
+
+    def test_substring_of_titles(self):
+        util.save_entries((title, 'content') for title in ['Python', 'CPython', 'Django', 'Py'])
+        self.assertEqual(util.get_related_results('pyth'), ['CPython', 'Python'])
+        # shorter than a trigram, the titles are scanned
+        self.assertEqual(util.get_related_results('py'), ['CPython', 'Py', 'Python'])
+        util.save_entry('Jython', 'content')
+        self.assertEqual(util.get_related_results('ytho'), ['CPython', 'Jython', 'Python'])
+
+
+class DeletionIndexTests(WikiTestCase):
+
+    titles = ['Python', 'Django', 'JavaScript', 'Programming Languages', 'Pythonic']
+
+    def setUp(self):
+        super().setUp()
+        self.index = DeletionIndex(self.titles, max_distance=2, prefix_length=7)
+
+    def test_typos_within_max_distance(self):
+        self.assertEqual(self.index.suggest('Pyhton'), ['Python'])
+        self.assertEqual(self.index.suggest('Djangoo'), ['Django'])
+        self.assertEqual(self.index.suggest('Dngo'), ['Django'])
+        self.assertEqual(self.index.suggest('jvascript'), ['JavaScript'])
+        self.assertEqual(self.index.suggest('Haskell'), [])
+
+    def test_transposition_is_one_edit(self):
+        self.assertEqual(edit_distance('python', 'pyhton'), 1)
+        self.assertEqual(self.index.suggest('Pyhtonic'), ['Pythonic'])
+
+    def test_typos_beyond_the_prefix(self):
+        self.assertEqual(self.index.suggest('Programming Langauges'), ['Programming Languages'])
+        self.assertEqual(self.index.suggest('Programing Languagez'), ['Programming Languages'])
+        self.assertEqual(self.index.suggest('Programming Langs'), [])
+
+    def test_matches_a_scan(self):
+        for query in ['pthon', 'javscrpt', 'djngo', 'pythons', 'xyz']:
+            expected = sorted((edit_distance(query, title.lower()), title) for title in self.titles
+                              if edit_distance(query, title.lower()) <= 2)
+            self.assertEqual(self.index.suggest(query), [title for _, title in expected])
+
+    def test_search_page_suggestions(self):
+        util.save_entries((title, 'content') for title in self.titles)
+        response = self.client.post('/search', {'title': 'Pyhton'})
+        self.assertEqual(response.context['related_results'], [])
+        self.assertEqual(response.context['suggestions'], ['Python'])
+
+
+class SearchPageTests(WikiTestCase):
+
+    def search(self, query):
+        response = self.client.post('/search', {'title': query})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_snippets_highlight_the_query_words(self):
+        util.save_entry('Python', 'Python is a programming language. '
+                                  'Its standard library is large.')
+        response = self.search('LIBRARY')
+        [(title, snippet)] = response.context['related_results']
+        self.assertEqual(title, 'Python')
+        self.assertIn('<mark>library</mark>', snippet)
+        self.assertContains(response, '<mark>library</mark>', html=True)
+
+    def test_summary_without_matching_words(self):
+        util.save_entry('Python', 'Python is a programming language.')
+        # only the title contains the query
+        response = self.search('pyth')
+        self.assertEqual(response.context['related_results'],
+                         [('Python', 'Python is a programming language.')])
+
+    @override_settings(WIKI_SEARCH_RESULTS_LIMIT=3)
+    def test_results_are_capped_before_the_snippets(self):
+        util.save_entries((f'Fruit {i}', f'An apple, number {i}.') for i in range(5))
+        with mock.patch.object(util, 'get_snippets', wraps=util.get_snippets) as get_snippets:
+            response = self.search('apple')
+        self.assertEqual(len(get_snippets.call_args.args[0]), 3)
+        self.assertEqual(len(response.context['related_results']), 3)
+        self.assertEqual(response.context['count'], 5)
+        self.assertContains(response, 'Showing the first 3 of 5 results')
+
+
+class SearchSuggestTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        util.save_entries((f'Python {i:02}', 'content') for i in range(60))
+        util.save_entries([('python', 'content'), ('Django', 'content')])
+
+    def suggest(self, **params):
+        response = self.client.get('/search/suggest', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix(self):
+        response = self.suggest(q='PYTHON 0', limit=3)
+        self.assertEqual(response, {'query': 'PYTHON 0', 'results': ['Python 00', 'Python 01', 'Python 02']})
+        self.assertEqual(self.suggest(q='dj')['results'], ['Django'])
+        self.assertEqual(self.suggest(q='flask')['results'], [])
+
+    def test_limit(self):
+        self.assertEqual(len(self.suggest(q='py')['results']), 10)
+        self.assertEqual(len(self.suggest(q='py', limit=100)['results']), 50)
+        self.assertEqual(len(self.suggest(q='py', limit=0)['results']), 1)
+        self.assertEqual(len(self.suggest(q='py', limit='many')['results']), 10)
+
+    def test_empty_query(self):
+        self.assertEqual(self.suggest(q='  '), {'query': '', 'results': []})
+        self.assertEqual(self.suggest(), {'query': '', 'results': []})
+
+
+class ConditionalGetTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        util.save_entry('Alpha', 'The first entry.')
+        self.set_mtime('Alpha', 1000000000)
+
+    def set_mtime(self, title, seconds):
+        os.utime(os.path.join(self.directory, 'entries', f'{title}.md'), (seconds, seconds))
+
+    def test_if_none_match(self):
+        response = self.client.get('/wiki/Alpha')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/wiki/Alpha', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        response = self.client.get('/wiki/Alpha')
+        self.assertEqual(response['Last-Modified'], http_date(1000000000))
+        response = self.client.get('/wiki/Alpha', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_backlink_changes(self):
+        etag = self.client.get('/wiki/Alpha')['ETag']
+        util.save_entry('Beta', 'See [Alpha](/wiki/Alpha).')
+        self.set_mtime('Beta', 1000000060)
+
+        response = self.client.get('/wiki/Alpha', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Beta')
+        # the page lists Beta, so it changed with it
+        self.assertEqual(response['Last-Modified'], http_date(1000000060))
+
+    def test_no_etag_while_messages_are_pending(self):
+        etag = self.client.get('/wiki/Alpha')['ETag']
+        response = self.client.post('/edit/Alpha', {'content': 'The first entry.'})
+        self.assertEqual(response.status_code, 302)
+
+        response = self.client.get('/wiki/Alpha', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'was not changed')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        # shown once, the next request is conditional again
+        response = self.client.get('/wiki/Alpha', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class ShardedBackendTests(WikiTestCase):
+
+    def backend_options(self):
+        return {'sharded': True}
+
+    def path(self, title):
+        return os.path.join(self.directory, 'entries', *shard(title).split('/'), f'{title}.md')
+
+    def test_read_write_list(self):
+        util.save_entries([('Python', 'A language.'), ('Django', 'A framework.')])
+        self.assertTrue(os.path.exists(self.path('Python')))
+        self.assertEqual(util.get_entry('Python'), 'A language.')
+        self.assertIsNone(util.get_entry('Flask'))
+        self.assertEqual(util.list_entries(), ['Django', 'Python'])
+
+        util.save_entry('Python', 'A programming language.')
+        self.assertEqual(util.get_entry('Python'), 'A programming language.')
+        self.assertEqual(util.list_entries(), ['Django', 'Python'])
+
+    def test_file_added_to_an_existing_shard(self):
+        util.save_entry('Python', 'A language.')
+        shard_directory = os.path.dirname(self.path('Flask'))
+        os.makedirs(shard_directory, exist_ok=True)
+        # all the directories changed a while ago
+        past = time.time_ns() - 10 ** 9
+        for directory in (os.path.join(self.directory, 'entries'), os.path.dirname(shard_directory),
+                          shard_directory):
+            os.utime(directory, ns=(past, past))
+        self.assertEqual(util.list_entries(), ['Python'])
+
+        # only the directory of the shard changes
+        with open(self.path('Flask'), 'w', encoding='utf-8') as f:
+            f.write('A framework.')
+        self.assertEqual(util.list_entries(), ['Flask', 'Python'])
+        self.assertEqual(util.find_entry('flask'), 'Flask')
+
+
+class ShardEntriesTests(WikiTestCase):
+
+    def test_shard_and_flatten(self):
+        self.write_file('Python', 'A language.')
+        self.write_file('Django', 'A framework.')
+        entries = os.path.join(self.directory, 'entries')
+
+        call_command('shard_entries', stdout=StringIO())
+        self.assertFalse([name for name in os.listdir(entries) if name.endswith('.md')])
+        with open(os.path.join(entries, *shard('Python').split('/'), 'Python.md'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'A language.')
+        with override_settings(WIKI_ENTRY_BACKEND_OPTIONS={'sharded': True}):
+            get_backend.cache_clear()
+            self.assertEqual(util.list_entries(), ['Django', 'Python'])
+            self.assertEqual(util.get_entry('Django'), 'A framework.')
+
+        call_command('shard_entries', '--flatten', stdout=StringIO())
+        # the shard directories are removed with the files
+        self.assertEqual(sorted(os.listdir(entries)), ['Django.md', 'Python.md'])
+        get_backend.cache_clear()
+        self.assertEqual(util.list_entries(), ['Django', 'Python'])
+        self.assertEqual(util.get_entry('Python'), 'A language.')
+
+
+class RevisionTests(WikiTestCase):
+
+    def test_delta(self):
+        previous = 'one\ntwo\nthree\nfour\n'
+        content = 'zero\none\nthree\nfour\nfive'
+        delta = revisions.encode_delta(previous, content)
+        self.assertEqual(revisions.apply_delta(previous, delta), content)
+        # the unchanged lines are copied rather than stored
+        self.assertNotIn('four\n', [line for operation in delta for line in operation])
+
+    @override_settings(WIKI_REVISION_SNAPSHOT_INTERVAL=3)
+    def test_snapshots(self):
+        versions = [f'Line {i}\n' * 3 + f'Version {i}\n' for i in range(1, 8)]
+        for content in versions:
+            util.save_entry('Alpha', content)
+
+        history = list(revisions.get_revisions('Alpha'))
+        self.assertEqual([revision.number for revision in history], [7, 6, 5, 4, 3, 2, 1])
+        self.assertEqual([revision.number for revision in history if revision.snapshot], [7, 4, 1])
+        for number, content in enumerate(versions, 1):
+            self.assertEqual(revisions.get_content('Alpha', number), content)
+        self.assertIsNone(revisions.get_content('Alpha', 8))
+
+    def test_unchanged_content(self):
+        util.save_entry('Alpha', 'apple')
+        self.assertFalse(util.save_entry('Alpha', 'apple'))
+        self.assertEqual(revisions.get_revisions('Alpha').count(), 1)
+
+    def test_change_outside_of_the_application(self):
+        util.save_entry('Alpha', 'apple')
+        self.write_file('Alpha', 'banana')
+        util.save_entry('Alpha', 'cherry')
+        # the version written outside of the application is kept too
+        self.assertEqual([revisions.get_content('Alpha', number) for number in (1, 2, 3)],
+                         ['apple', 'banana', 'cherry'])
+
+
+class GenerationTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, '.wiki-generation')
+        # two processes sharing the file
+        self.first, self.second = Generation(path), Generation(path)
+        self.first_callback, self.second_callback = mock.Mock(), mock.Mock()
+        self.first.subscribe(self.first_callback)
+        self.second.subscribe(self.second_callback)
+        self.first.check()
+        self.second.check()
+
+    def test_bump_runs_the_callbacks_of_other_processes(self):
+        self.first.bump()
+        self.second.check()
+        self.second_callback.assert_called_once_with()
+        self.assertEqual(self.second.value(), 1)
+        # checked again without a change
+        self.second.check()
+        self.second_callback.assert_called_once_with()
+
+    def test_own_bump_runs_no_callbacks(self):
+        self.first.bump()
+        self.first.check()
+        self.first_callback.assert_not_called()
+        self.assertEqual(self.first.stats()['changes'], 0)
+
+    def test_bump_while_behind(self):
+        self.first.bump()
+        # the second process bumps before seeing the first change
+        self.second.bump()
+        self.second.check()
+        self.second_callback.assert_called_once_with()
+        self.first.check()
+        self.first_callback.assert_called_once_with()
+
+
+class LinkGraphTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        util.save_entry('Alpha', 'See [Beta](/wiki/Beta), [Gamma](/wiki/Gamma) and [me](/wiki/Alpha).')
+        util.save_entry('Beta', 'Back to <a href="/wiki/Alpha">Alpha</a>, also [beta](/wiki/beta).')
+        util.save_entry('Delta', 'Nobody links here, see [Alpha](/wiki/Alpha).')
+
+    def test_backlinks(self):
+        self.assertEqual(util.get_backlinks('Alpha'), ['Beta', 'Delta'])
+        self.assertEqual(util.get_backlinks('Beta'), ['Alpha'])
+        self.assertEqual(util.get_backlinks('Delta'), [])
+
+    def test_orphans(self):
+        self.assertEqual(util.get_orphans(), ['Delta'])
+
+    def test_wanted(self):
+        # titles match exactly, a link to beta does not lead to Beta
+        self.assertEqual(util.get_wanted(), [('Gamma', ['Alpha']), ('beta', ['Beta'])])
+
+    def test_update(self):
+        util.save_entry('Alpha', 'See [Delta](/wiki/Delta).')
+        self.assertEqual(util.get_backlinks('Beta'), [])
+        self.assertEqual(util.get_backlinks('Delta'), ['Alpha'])
+        self.assertEqual(util.get_orphans(), ['Beta'])
+        self.assertEqual(util.get_wanted(), [('beta', ['Beta'])])
+
+
+class PaginationTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.titles = [f'Entry {i:02}' for i in range(25)] + ['apple', 'Banana', 'entry']
+        util.save_entries((title, f'Content of {title}') for title in self.titles)
+
+    def pages(self, prefix='', limit=10):
+        titles, cursor = util.page_entries(prefix, limit=limit)
+        pages = [titles]
+        while cursor is not None:
+            titles, cursor = util.page_entries(prefix, after=cursor, limit=limit)
+            pages.append(titles)
+        return pages
+
+    def test_cursors(self):
+        pages = self.pages()
+        self.assertEqual([len(page) for page in pages], [10, 10, 8])
+        self.assertEqual([title for page in pages for title in page],
+                         sorted(self.titles, key=lambda title: (title.lower(), title)))
+
+    def test_prefix(self):
+        pages = self.pages('E')
+        self.assertEqual([len(page) for page in pages], [10, 10, 6])
+        self.assertEqual(pages[0][:2], ['entry', 'Entry 00'])
+
+    def test_entry_added_between_pages(self):
+        titles, cursor = util.page_entries(limit=10)
+        util.save_entry('Entry 15a', 'Content')
+        titles, _ = util.page_entries(after=cursor, limit=10)
+        self.assertIn('Entry 15a', titles)
+
+    def test_index_page(self):
+        response = self.client.get('/', {'letter': 'e'})
+        entries = [entry for entry, _ in response.context['entries']]
+        self.assertEqual(len(entries), 26)
+        response = self.client.get('/', {'after': 'Entry 09'})
+        self.assertEqual(response.context['entries'][0][0], 'Entry 10')
+
+
+class ImportExportTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        util.save_entries([('Python', 'A language.'), ('Django', 'A framework.')])
+
+    def archive(self, name):
+        return os.path.join(self.directory, name)
+
+    def import_entries(self, path):
+        stdout = StringIO()
+        call_command('import_entries', path, stdout=stdout)
+        return stdout.getvalue()
+
+    def remove_entries(self):
+        for title in util.list_entries():
+            os.remove(os.path.join(self.directory, 'entries', f'{title}.md'))
+        self.reset_caches()
+        self.assertEqual(util.list_entries(), [])
+
+    def assert_round_trip(self, path):
+        call_command('export_entries', path, stderr=StringIO())
+        self.remove_entries()
+        self.assertIn('Imported 2 of 2 entries, 0 unchanged', self.import_entries(path))
+        self.assertEqual(util.list_entries(), ['Django', 'Python'])
+        self.assertEqual(util.get_entry('Python'), 'A language.')
+
+    def test_tar_round_trip(self):
+        path = self.archive('entries.tar.gz')
+        self.assert_round_trip(path)
+        with tarfile.open(path) as archive:
+            self.assertEqual(sorted(archive.getnames()), ['entries/Django.md', 'entries/Python.md'])
+
+    def test_zip_round_trip(self):
+        path = self.archive('entries.zip')
+        self.assert_round_trip(path)
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['entries/Django.md', 'entries/Python.md'])
+
+    def test_unchanged_entries_are_skipped(self):
+        path = self.archive('entries.zip')
+        call_command('export_entries', path, stderr=StringIO())
+        util.save_entry('Python', 'A programming language.')
+        self.assertIn('Imported 1 of 2 entries, 1 unchanged', self.import_entries(path))
+        self.assertEqual(util.get_entry('Python'), 'A language.')
+        self.assertIn('Imported 0 of 2 entries, 2 unchanged', self.import_entries(path))
+
+    def test_duplicate_titles(self):
+        path = self.archive('entries.tar')
+        with tarfile.open(path, 'w') as archive:
+            for content in (b'First.', b'Second.'):
+                info = tarfile.TarInfo('entries/Flask.md')
+                info.size = len(content)
+                archive.addfile(info, BytesIO(content))
+        self.import_entries(path)
+        # the last content wins and is recorded once
+        self.assertEqual(util.get_entry('Flask'), 'Second.')
+        self.assertEqual(revisions.get_revisions('Flask').count(), 1)
+
+    def test_bad_archive(self):
+        path = self.archive('entries.tar.gz')
+        with open(path, 'wb') as f:
+            f.write(b'not an archive')
+        with self.assertRaisesMessage(CommandError, 'Could not read the archive'):
+            self.import_entries(path)
+        with self.assertRaisesMessage(CommandError, 'does not exist'):
+            self.import_entries(self.archive('missing.zip'))
+
+
+def png(width, height):
+    # the signature and IHDR chunk, which hold the dimensions
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I4sII', 13, b'IHDR', width, height)
+
+
+def gif(width, height):
+    return b'GIF89a' + struct.pack('<HH', width, height)
+
+
+def jpeg(width, height):
+    # an APP0 segment, skipped, then the start of frame
+    return (b'\xff\xd8' + b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + b'\x00' * 9
+            + b'\xff\xc0' + struct.pack('>HBHH', 17, 8, height, width) + b'\x00' * 10)
+
+
+class ImageTests(WikiTestCase):
+
+    def write_image(self, path, data):
+        full_path = os.path.join(self.directory, 'images', *path.split('/'))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+        return full_path
+
+    def test_extract_images(self):
+        content = ('![A red apple](/images/fruit/apple.png "Fresh fruit") and '
+                   '<img src="/images/my%20pear.gif" alt="A pear" title="Ripe"> but not '
+                   '![remote](https://example.com/a.png) nor <img src="/static/b.png">')
+        self.assertEqual(images.extract_images(content), {
+            'fruit/apple.png': 'A red apple Fresh fruit',
+            'my pear.gif': 'A pear Ripe',
+        })
+        self.assertEqual(images.extract_images('![](/images/plain.jpg)'), {'plain.jpg': ''})
+
+    def test_read_dimensions(self):
+        self.assertEqual(images.read_dimensions(png(640, 480)), (640, 480))
+        self.assertEqual(images.read_dimensions(gif(32, 16)), (32, 16))
+        self.assertEqual(images.read_dimensions(jpeg(800, 600)), (800, 600))
+        self.assertIsNone(images.read_dimensions(b'not an image'))
+        self.assertIsNone(images.read_dimensions(png(640, 480)[:20]))
+
+    def test_index_images_incrementally(self):
+        self.write_image('apple.png', png(640, 480))
+        pear = self.write_image('fruit/pear.gif', gif(32, 16))
+        self.assertEqual(images.index_images(), 2)
+        image = Image.objects.get(path='fruit/pear.gif')
+        self.assertEqual((image.width, image.height), (32, 16))
+        # nothing changed
+        self.assertEqual(images.index_images(), 0)
+
+        self.write_image('apple.png', png(1280, 960) + b'\x00')
+        os.remove(pear)
+        self.assertEqual(images.index_images(), 1)
+        self.assertEqual(list(Image.objects.values_list('path', 'width')), [('apple.png', 1280)])
+
+    def test_image_search(self):
+        self.write_image('fruit/apple.png', png(640, 480))
+        self.write_image('pear.jpg', jpeg(800, 600))
+        images.index_images()
+        util.save_entries([
+            ('Apple', '![A red apple](/images/fruit/apple.png "Fresh fruit")'),
+            ('Pear', '<img src="/images/pear.jpg" alt="A green pear">'),
+        ])
+
+        def search(q):
+            response = self.client.get('/search/web', {'q': q, 'tbm': 'isch'})
+            self.assertEqual(response.status_code, 200)
+            return [image['path'] for image in response.context['results']]
+
+        self.assertEqual(search('apple'), ['fruit/apple.png'])
+        self.assertEqual(search('fresh'), ['fruit/apple.png'])
+        self.assertEqual(search('"green pear"'), ['pear.jpg'])
+        self.assertEqual(search('"red fruit"'), [])
+        self.assertEqual(search('apple OR pear'), ['fruit/apple.png', 'pear.jpg'])
+        self.assertEqual(search('banana'), [])
+
+    def test_image_paths_stay_in_the_images_directory(self):
+        self.write_image('fruit/apple.png', png(640, 480))
+        self.write_file('Secret', 'Not an image.')
+        response = self.client.get('/images/fruit/apple.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), png(640, 480))
+        for path in ['../entries/Secret.md', 'fruit/../../entries/Secret.md',
+                     '..%2Fentries%2FSecret.md', 'missing.png', 'fruit']:
+            self.assertEqual(self.client.get(f'/images/{path}').status_code, 404, path)
+
+
+class ParseQueryTests(TestCase):
+
+    def test_words_and_phrases(self):
+        self.assertEqual(parse_query('web "python framework" -flask'),
+                         Query([['web'], ['python', 'framework']], [], [['flask']]))
+
+    def test_or_groups(self):
+        # a OR b c OR d means (a OR b) AND (c OR d)
+        self.assertEqual(parse_query('a OR b c OR d'),
+                         Query([], [[['a'], ['b']], [['c'], ['d']]], []))
+        self.assertEqual(parse_query('a OR b OR c d'),
+                         Query([['d']], [[['a'], ['b'], ['c']]], []))
+
+    def test_or_keeps_phrases(self):
+        self.assertEqual(parse_query('x OR "foo bar"'),
+                         Query([], [[['x'], ['foo', 'bar']]], []))
+
+    def test_or_before_an_excluded_word(self):
+        # baz is not an alternative to foo
+        self.assertEqual(parse_query('foo OR -bar baz'),
+                         Query([['foo'], ['baz']], [], [['bar']]))
+        self.assertEqual(parse_query('foo OR -"bar qux" baz'),
+                         Query([['foo'], ['baz']], [], [['bar', 'qux']]))
+
+    def test_advanced_fields(self):
+        query = parse_query('a OR b', all_words='c', phrase='d e', any_words='f g', none_words='h')
+        self.assertEqual(query.required, [['c'], ['d', 'e']])
+        # the words of as_oq are one more group, ANDed with those of q
+        self.assertEqual(query.optional, [[['a'], ['b']], [['f'], ['g']]])
+        self.assertEqual(query.excluded, [['h']])
+
+
+class QueryEntriesTests(WikiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        util.save_entries([
+            ('Apple', 'apple cherry'),
+            ('Banana', 'banana durian'),
+            ('Mixed', 'apple durian'),
+            ('Phrase', 'foo bar cherry'),
+            ('Reversed', 'bar foo cherry'),
+        ])
+
+    def query(self, q, **fields):
+        return sorted(util.query_entries(parse_query(q, **fields)))
+
+    def test_or_groups(self):
+        self.assertEqual(self.query('apple OR banana cherry OR durian'),
+                         ['Apple', 'Banana', 'Mixed'])
+        self.assertEqual(self.query('apple OR banana durian'), ['Banana', 'Mixed'])
+
+    def test_or_phrase(self):
+        self.assertEqual(self.query('banana OR "foo bar"'), ['Banana', 'Phrase'])
+
+    def test_any_words_and_or_groups(self):
+        self.assertEqual(self.query('apple OR banana', any_words='cherry'), ['Apple'])
+        self.assertEqual(self.query('apple OR banana', any_words='durian cherry'),
+                         ['Apple', 'Banana', 'Mixed'])
+
+    def test_excluded(self):
+        self.assertEqual(self.query('cherry -"foo bar"'), ['Apple', 'Reversed'])
+
+
+class SQLiteQueryEntriesTests(QueryEntriesTests):
+    backend = 'encyclopedia.backends.SQLiteBackend'
+
+    def backend_options(self):
+        return {'path': os.path.join(self.directory, 'entries.sqlite3')}
+
+
+class ExportStaticTests(WikiTransactionTestCase):
+
+    workers = 1
+
+    def export(self, *args):
+        output = os.path.join(self.directory, 'export')
+        # e.g. a {% csrf_token %} rendered without a request warns in debug mode
+        with warnings.catch_warnings(), override_settings(DEBUG=True):
+            warnings.simplefilter('error')
+            call_command('export_static', output, '--workers', str(self.workers), *args,
+                         stdout=StringIO())
+        return output
+
+    def test_export(self):
+        util.save_entry('Python', 'Python is a programming language.')
+        util.save_entry('Django', 'Django is written in [Python](/wiki/Python).')
+        output = self.export()
+
+        self.assertEqual(sorted(os.listdir(os.path.join(output, 'wiki'))),
+                         ['Django.html', 'Python.html'])
+        with open(os.path.join(output, 'wiki', 'Python.html'), encoding='utf-8') as f:
+            # the page lists the entries linking to it
+            self.assertIn('Django', f.read())
+        with open(os.path.join(output, 'index.html'), encoding='utf-8') as f:
+            index = f.read()
+        self.assertIn('Django', index)
+        self.assertIn('Python is a programming language.', index)
+        with open(os.path.join(output, '.export-manifest.json'), encoding='utf-8') as f:
+            self.assertEqual(sorted(json.load(f)), ['Django', 'Python'])
+
+    def test_incremental_export(self):
+        util.save_entry('Python', 'Python is a programming language.')
+        util.save_entry('Django', 'Django is a web framework.')
+        self.export()
+        util.save_entry('Django', 'Django is a Python web framework.')
+        output = self.export('--incremental')
+
+        with open(os.path.join(output, 'wiki', 'Django.html'), encoding='utf-8') as f:
+            self.assertIn('Django is a Python web framework.', f.read())
+        stdout = StringIO()
+        call_command('export_static', output, '--workers', str(self.workers), '--incremental',
+                     stdout=stdout)
+        self.assertIn('0 rendered, 2 unchanged', stdout.getvalue())
+
+
+class ParallelExportStaticTests(ExportStaticTests):
+    '''
+    Renders the entries in worker processes, which read the database
+    committed by the test.
+    '''
+
+    workers = 2
+
+    def test_metadata_missing_before_the_export(self):
+        # entries written outside of the application have no metadata yet,
+        # the workers must not write it concurrently
+        for i in range(20):
+            self.write_file(f'Entry {i}', f'Entry {i} links to [Entry {i + 1}](/wiki/Entry {i + 1}).')
+        output = self.export()
+
+        self.assertEqual(len(os.listdir(os.path.join(output, 'wiki'))), 20)
+        with open(os.path.join(output, 'index.html'), encoding='utf-8') as f:
+            self.assertIn('Entry 3 links to Entry 4.', f.read())
@@ -0,0 +1,291 @@
+import bisect
+import threading
+
+from django.conf import settings
+
+from .backends import get_backend
+
+
+def edit_distance(a, b):
+    '''
+    Returns the Damerau-Levenshtein (optimal string alignment) distance
+    between two strings.
+    '''
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+
+class TrigramIndex:
+    '''
+    Maps every three-character substring of the lowercase titles to the
+    titles containing it, so that a substring query only has to check
+    the titles sharing all of its trigrams.
+    '''
+
+    def __init__(self, titles=()):
+        self._trigrams = {}
+        for title in titles:
+            self.add(title)
+
+    @staticmethod
+    def trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, title):
+        for trigram in self.trigrams(title.lower()):
+            self._trigrams.setdefault(trigram, set()).add(title)
+
+    def search(self, query, titles):
+        '''
+        Returns the sorted titles containing the query, ignoring case.
+        Queries shorter than a trigram fall back to scanning `titles`.
+        '''
+        query = query.lower()
+        if len(query) < 3:
+            return [title for title in titles if query in title.lower()]
+
+        postings = []
+        for trigram in self.trigrams(query):
+            titles_with_trigram = self._trigrams.get(trigram)
+            if not titles_with_trigram:
+                return []
+            postings.append(titles_with_trigram)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return sorted(title for title in candidates if query in title.lower())
+
+
+class DeletionIndex:
+    '''
+    A SymSpell-style dictionary mapping every string obtainable by
+    deleting up to `max_distance` characters from the prefix of a
+    lowercase title to the titles it came from.
+
+    Two strings within `max_distance` edits of each other share at least
+    one such deletion, so looking up the deletions of a query yields every
+    candidate in a handful of dictionary lookups. Only the first
+    `prefix_length` characters are used, which bounds the number of
+    deletions per title; candidates are verified on the full string.
+    '''
+
+    def __init__(self, titles=(), max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._deletes = {}
+        for title in titles:
+            self.add(title)
+
+    def _variants(self, word):
+        variants = {word}
+        edges = {word}
+        for _ in range(self.max_distance):
+            edges = {edge[:i] + edge[i + 1:] for edge in edges for i in range(len(edge))}
+            variants |= edges
+        return variants
+
+    def add(self, title):
+        for variant in self._variants(title.lower()[:self.prefix_length]):
+            self._deletes.setdefault(variant, set()).add(title)
+
+    def suggest(self, query, limit=5):
+        '''
+        Returns up to `limit` titles within `max_distance` edits of the
+        query, ignoring case, closest first.
+        '''
+        query = query.lower()
+        candidates = set()
+        for variant in self._variants(query[:self.prefix_length]):
+            candidates |= self._deletes.get(variant, set())
+
+        suggestions = []
+        for title in candidates:
+            lowered = title.lower()
+            if abs(len(lowered) - len(query)) > self.max_distance:
+                continue
+            distance = edit_distance(query, lowered)
+            if distance <= self.max_distance:
+                suggestions.append((distance, title))
+        return [title for _, title in sorted(suggestions)[:limit]]
+
+
+class TitleIndex:
+    '''
+    A process-wide index of encyclopedia entry titles.
+
+    The index holds the sorted list of titles together with a map from
+    the lowercase title to its canonical spelling. It is loaded once from
+    the entry storage backend and afterwards kept up to date by `add`.
+
+    Every lookup revalidates the index against the version of the backend,
+    which changes whenever an entry is added or removed (for files, the
+    modification time of the entries directory), so entries added or
+    removed out-of-band are still picked up at the cost of a single stat
+    call or query.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._titles = None
+        self._lookup = {}
+        self._version = None
+        self._trigrams = None
+        self._deletes = None
+        self._folded = None
+
+    def _current_version(self):
+        return get_backend().version()
+
+    def _load(self, version):
+        titles = sorted(get_backend().list_titles())
+        self._titles = titles
+        self._lookup = {title.lower(): title for title in titles}
+        self._version = version
+        self._trigrams = None
+        self._deletes = None
+        self._folded = None
+
+    def _revalidate(self):
+        version = self._current_version()
+        if self._titles is None or version is None or version != self._version:
+            with self._lock:
+                if self._titles is None or version is None or version != self._version:
+                    self._load(version)
+
+    def titles(self):
+        '''
+        Returns the sorted list of all titles. The list is shared,
+        callers must not modify it.
+        '''
+        self._revalidate()
+        return self._titles
+
+    def find(self, title):
+        '''
+        Returns the canonical spelling of the title, ignoring case,
+        or None if there is no such entry.
+        '''
+        self._revalidate()
+        return self._lookup.get(title.lower())
+
+    def search(self, query):
+        '''
+        Returns the sorted titles that contain the query, ignoring case.
+        The trigram index is built on the first search.
+        '''
+        self._revalidate()
+        trigrams = self._trigrams
+        if trigrams is None:
+            with self._lock:
+                if self._trigrams is None:
+                    self._trigrams = TrigramIndex(self._titles)
+                trigrams = self._trigrams
+        return trigrams.search(query, self._titles)
+
+    def suggest(self, query, limit=5):
+        '''
+        Returns titles within a few typos of the query, closest first.
+        The deletion index is built on the first call.
+        '''
+        self._revalidate()
+        deletes = self._deletes
+        if deletes is None:
+            with self._lock:
+                if self._deletes is None:
+                    self._deletes = DeletionIndex(
+                        self._titles,
+                        max_distance=getattr(settings, 'WIKI_SUGGEST_MAX_DISTANCE', 2))
+                deletes = self._deletes
+        return deletes.suggest(query, limit)
+
+    def complete(self, prefix, limit=10):
+        '''
+        Returns up to `limit` titles starting with the prefix, ignoring
+        case, in alphabetical order.
+        '''
+        return self.page(prefix, limit=limit)[0]
+
+    def page(self, prefix='', after=None, limit=100):
+        '''
+        Returns up to `limit` titles starting with the prefix, ignoring
+        case, in alphabetical order, beginning after the title `after`,
+        together with the cursor of the next page or None if this is the
+        last one. The titles sorted by their lowercase form are built on
+        the first call and searched with bisection, so a page costs the
+        same however many titles there are.
+        '''
+        self._revalidate()
+        folded = self._folded
+        if folded is None:
+            with self._lock:
+                if self._folded is None:
+                    self._folded = sorted((title.lower(), title) for title in self._titles)
+                folded = self._folded
+
+        prefix = prefix.lower()
+        if after is not None:
+            start = max(bisect.bisect_right(folded, (after.lower(), after)),
+                        bisect.bisect_left(folded, (prefix,)))
+        else:
+            start = bisect.bisect_left(folded, (prefix,))
+
+        titles = []
+        for i in range(start, len(folded)):
+            lowered, title = folded[i]
+            if not lowered.startswith(prefix):
+                return titles, None
+            if len(titles) == limit:
+                return titles, titles[-1]
+            titles.append(title)
+        return titles, None
+
+    def add(self, title):
+        '''
+        Records a title that has just been saved to the backend.
+        '''
+        with self._lock:
+            if self._titles is None:
+                self._load(self._current_version())
+                return
+            i = bisect.bisect_left(self._titles, title)
+            if i == len(self._titles) or self._titles[i] != title:
+                # copy on write, readers may still hold the old list
+                titles = list(self._titles)
+                titles.insert(i, title)
+                self._titles = titles
+            self._lookup.setdefault(title.lower(), title)
+            if self._trigrams is not None:
+                self._trigrams.add(title)
+            if self._deletes is not None:
+                self._deletes.add(title)
+            if self._folded is not None:
+                key = (title.lower(), title)
+                i = bisect.bisect_left(self._folded, key)
+                if i == len(self._folded) or self._folded[i] != key:
+                    folded = list(self._folded)
+                    folded.insert(i, key)
+                    self._folded = folded
+            self._version = self._current_version()
+
+    def clear(self):
+        '''
+        Drops the loaded titles so that the next lookup reloads them.
+        '''
+        with self._lock:
+            self._titles = None
+            self._lookup = {}
+            self._version = None
+            self._trigrams = None
+            self._deletes = None
+            self._folded = None
+
+
+title_index = TitleIndex()
@@ -6,7 +6,16 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('wiki/<str:title>', views.entry_page, name='entry_page'),
     path('search', views.search, name='search'),
+    path('search/suggest', views.search_suggest, name='search_suggest'),
+    path('search/web', views.web_search, name='web_search'),
     path('create', views.new_page, name='new_page'),
     path('edit/<str:title>', views.edit_page, name='edit_page'),
+    path('history/<str:title>', views.history, name='history'),
+    path('history/<str:title>/<int:number>', views.revision, name='revision'),
     path('random', views.random_page, name='random_page'),
+    path('orphans', views.orphans, name='orphans'),
+    path('wanted', views.wanted, name='wanted'),
+    path('stats', views.stats, name='stats'),
+    path('images/<path:path>', views.image, name='image'),
+    path('thumbnails/<int:pk>', views.image_thumbnail, name='image_thumbnail'),
 ]
@@ -1,28 +1,155 @@
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import images, links, metadata, revisions
+from .backends import get_backend
+from .coherence import generation
+from .fulltext import search_index
+from .rendering import content_hash, render_cache
+from .titles import title_index
+
+
+# the title index revalidates itself against the backend version and
+# rendered pages are keyed by content, only the search indexes need help
+generation.subscribe(search_index.refresh)
+generation.subscribe(images.image_index.clear)
 
 
 def list_entries():
     '''
     Returns a list of all names of encyclopedia entries.
     '''
-    _, filenames = default_storage.listdir('entries')
-    return list(sorted(re.sub(r'\.md$', '', filename)
-                for filename in filenames if filename.endswith('.md')))
+    return list(title_index.titles())
+
+
+def page_entries(prefix='', after=None, limit=100):
+    '''
+    Returns a page of up to `limit` encyclopedia entries whose titles start
+    with the prefix, in alphabetical order ignoring case, beginning after
+    the entry `after`, and the cursor of the next page (None on the last).
+    '''
+    return title_index.page(prefix, after, limit)
+
+
+def find_entry(title):
+    '''
+    Returns the title of the existing encyclopedia entry matching
+    the given title regardless of case, or None if there is no such entry.
+    '''
+    return title_index.find(title)
+
+
+def _normalized(content):
+    return content.replace('\r\n', '\n').replace('\r', '\n').strip()
+
+
+def _write_entry(backend, title, content):
+    '''
+    Writes an entry unless its content is unchanged. Returns whether it
+    was written, the content it replaced (None for a new entry) and the
+    content as written.
+
+    Browsers post CRLF line endings and the forms strip the surrounding
+    whitespace, so contents differing only in these are the same, and a
+    changed entry keeps the line endings it had.
+    '''
+    previous = backend.read(title)
+    if previous is not None:
+        if _normalized(previous) == _normalized(content):
+            return False, previous, content
+        content = content.replace('\r\n', '\n')
+        if '\r\n' in previous:
+            content = content.replace('\n', '\r\n')
+    backend.write(title, content)
+    return True, previous, content
+
+
+def _update_metadata(backend, title, content):
+    stat = backend.stat(title)
+    return metadata.update(title, content, render_entry(title, content),
+                           stat.mtime_ns if stat is not None else time.time_ns())
 
 
 def save_entry(title, content):
     '''
     Saves an encyclopedia entry, given its title and Markdown
     content. If an existing entry with the same title already exists,
-    it is replaced.
+    it is replaced and the change is recorded in its revision history.
+
+    Returns False without writing anything if the content is identical
+    to the existing entry, True otherwise.
     '''
-    filename = f'entries/{title}.md'
-    if default_storage.exists(filename):
-        default_storage.delete(filename)
-    default_storage.save(filename, ContentFile(content))
+    backend = get_backend()
+    written, previous, content = _write_entry(backend, title, content)
+    if not written:
+        return False
+
+    revisions.record(title, previous, content)
+    links.update(title, content)
+    images.update_references(title, content)
+    title_index.add(title)
+    render_cache.invalidate(title)
+    _update_metadata(backend, title, content)
+    if not backend.supports_search:
+        search_index.update(title, content)
+    generation.bump()
+    return True
+
+
+def _batches(entries, size):
+    # each title once per batch, with its last content, so that no two
+    # threads write the same entry or number its revisions at once
+    batch = {}
+    for title, content in entries:
+        batch[title] = content
+        if len(batch) >= size:
+            yield list(batch.items())
+            batch = {}
+    if batch:
+        yield list(batch.items())
+
+
+def save_entries(entries, workers=8, batch_size=1000):
+    '''
+    Saves many encyclopedia entries, given pairs of a title and Markdown
+    content, skipping those whose content is unchanged. The entries are
+    saved `batch_size` at a time: the files of a batch are written by a
+    pool of threads, its revisions and links are recorded in a single
+    transaction, and the title index is refreshed once at the end
+    instead of once per entry. A title given more than once ends up with
+    its last content.
+
+    Returns the titles of the entries that were written.
+    '''
+    backend = get_backend()
+
+    def write(entry):
+        title, content = entry
+        written, previous, content = _write_entry(backend, title, content)
+        return (title, previous, content) if written else None
+
+    saved = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in _batches(entries, batch_size):
+            changed = [result for result in executor.map(write, batch) if result is not None]
+
+            with transaction.atomic():
+                for title, previous, content in changed:
+                    revisions.record(title, previous, content)
+                    links.update(title, content)
+                    images.update_references(title, content)
+            for title, _, content in changed:
+                render_cache.invalidate(title)
+                _update_metadata(backend, title, content)
+                if not backend.supports_search:
+                    search_index.update(title, content)
+                saved[title] = None
+    if saved:
+        title_index.clear()
+        generation.bump()
+    return list(saved)
 
 
 def get_entry(title):
@@ -30,20 +157,134 @@ def get_entry(title):
     Retrieves an encyclopedia entry by its title. If no such
     entry exists, the function returns None.
     '''
-    try:
-        f = default_storage.open(f'entries/{title}.md')
-        return f.read().decode('utf-8')
-    except FileNotFoundError:
-        return None
+    return get_backend().read(title)
+
+
+def render_entry(title, content):
+    '''
+    Converts the Markdown content of an encyclopedia entry to HTML,
+    reusing a previously rendered copy of the same content if possible.
+    '''
+    return render_cache.render(title, content)
+
+
+def get_entry_stat(title):
+    '''
+    Returns the modification time in nanoseconds and the size of an
+    encyclopedia entry without reading it, or None if no such entry exists.
+    '''
+    return get_backend().stat(title)
+
+
+def get_metadata(title, content):
+    '''
+    Returns the precomputed metadata of an encyclopedia entry: its word
+    count, table of contents, summary and modification time. It is
+    computed again only if it is missing or was stored for another
+    version of the content, e.g. after the entry was changed on disk.
+    '''
+    stored = metadata.get(title)
+    if (stored is None or stored.content_hash != content_hash(content)
+            or stored.version != metadata.VERSION):
+        stored = _update_metadata(get_backend(), title, content)
+    return stored
+
+
+def get_summaries(titles):
+    '''
+    Returns the stored summaries of the given encyclopedia entries keyed
+    by title. Entries without metadata are left out.
+    '''
+    return metadata.get_summaries(titles)
+
+
+def get_snippets(titles, query):
+    '''
+    Returns a snippet of each of the given encyclopedia entries keyed by
+    title, with the words of the query highlighted.
+    '''
+    return metadata.get_snippets(titles, query)
+
+
+def get_backlinks(title):
+    '''
+    Returns the encyclopedia entries linking to the given entry.
+    '''
+    return links.get_backlinks(title)
+
+
+def get_orphans():
+    '''
+    Returns the encyclopedia entries no other entry links to.
+    '''
+    return links.get_orphans(title_index.titles())
+
+
+def get_wanted():
+    '''
+    Returns the titles that are linked to but have no entry yet,
+    each with the entries linking to it. Like backlinks and orphans,
+    and like the entry pages the links lead to, titles must match exactly.
+    '''
+    return links.get_wanted(lambda title: title_index.find(title) == title)
 
 
 def get_related_results(title):
     '''
-    Returns related encyclopedia entries by the given title.
+    Returns related encyclopedia entries by the given title, that is
+    the entries which contain the title as a substring.
+    '''
+    return title_index.search(title)
+
+
+def complete_entries(prefix, limit=10):
+    '''
+    Returns up to `limit` encyclopedia entries whose titles start
+    with the given prefix, ignoring case.
     '''
-    related_results = []
+    return title_index.complete(prefix, limit)
+
 
-    for entry in list_entries():
-        if title.lower() in entry.lower():
-            related_results.append(entry)
-    return related_results
+def suggest_entries(title):
+    '''
+    Returns encyclopedia entries whose titles are a few typos away
+    from the given title, closest first.
+    '''
+    return title_index.suggest(title)
+
+
+def search_entries(query):
+    '''
+    Returns encyclopedia entries related to the given query: first the
+    entries with the query in their title, then the entries whose title
+    or content matches the words of the query, most relevant first.
+    '''
+    backend = get_backend()
+    if backend.supports_search:
+        content_results = backend.search(query)
+    else:
+        content_results = search_index.search(query)
+
+    related_results = get_related_results(query)
+    seen = set(related_results)
+    return related_results + [entry for entry in content_results
+                              if entry not in seen]
+
+
+def query_entries(query):
+    '''
+    Returns the encyclopedia entries matching a full-text Query with
+    required, optional and excluded phrases, most relevant first.
+    '''
+    backend = get_backend()
+    if backend.supports_search:
+        return backend.query(query)
+    return search_index.query(query)
+
+
+def query_images(query):
+    '''
+    Returns the images matching a full-text Query by their file names and
+    the text the encyclopedia entries give them, most relevant first.
+    '''
+    return images.image_index.query(query)
@@ -1,12 +1,39 @@
+import difflib
+import posixpath
 import random
+import string
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import quote
 from django import forms
+from django.conf import settings
 from django.contrib import messages
-from django.http import Http404
-from django.shortcuts import render, redirect
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
-from markdown2 import Markdown
+from django.utils.cache import patch_cache_control
+from django.utils.html import escape
+from django.views.decorators.http import condition
 
-from . import util
+from . import revisions, util
+from .fulltext import parse_query, query_words
+from .models import Image
+
+
+# the place of the entries in encyclopedia/index_all.html
+STREAM_MARKER = '<!-- entries -->'
+
+# the characters {% url %} leaves unquoted in entry titles
+URL_SAFE = "/#%[]=:;$&()+,!?*@'~"
+
+# the number of results on a page of the web search
+WEB_SEARCH_PAGE_SIZE = 10
+
+# part of the ETags of entry pages, to be raised when their template changes
+ENTRY_PAGE_VERSION = 1
 
 
 class SearchForm(forms.Form):
@@ -57,14 +84,111 @@ class EditPageForm(forms.Form):
 
 def index(request):
     '''
-    It lists the names of all pages in the encyclopedia (all entries).
+    It lists the names of the pages in the encyclopedia (entries) with
+    their summaries, a page at a time, optionally only those starting
+    with a given letter.
+
+    Format: /?letter=LETTER&after=TITLE, where TITLE is the last entry
+    of the previous page. With /?all=1 the names of all entries are
+    streamed in a single response.
     '''
+    if request.GET.get('all'):
+        return index_stream(request)
+
+    letter = request.GET.get('letter', '')[:1]
+    after = request.GET.get('after') or None
+    page_size = getattr(settings, 'WIKI_INDEX_PAGE_SIZE', 200)
+    entries, next_cursor = util.page_entries(letter, after, page_size)
+
+    summaries = util.get_summaries(entries)
+
     return render(request, 'encyclopedia/index.html', {
-        'entries': util.list_entries(),
+        'entries': [(entry, summaries.get(entry, '')) for entry in entries],
+        'letter': letter.upper(),
+        'letters': string.ascii_uppercase,
+        'next_cursor': next_cursor,
         'search': SearchForm()
     })
 
 
+def index_stream(request):
+    '''
+    It streams the names of all pages in the encyclopedia, so that
+    memory use and the time to the first byte do not grow with the
+    number of entries.
+    '''
+    page = render_to_string('encyclopedia/index_all.html', {
+        'search': SearchForm()
+    }, request)
+    head, tail = page.split(STREAM_MARKER)
+    entry_url = reverse('entry_page', args=['TITLE']).replace('TITLE', '')
+
+    def stream():
+        yield head
+        entries, cursor = util.page_entries(limit=1000)
+        while True:
+            yield ''.join(
+                f'<li><a href="{escape(entry_url + quote(entry, safe=URL_SAFE))}">{escape(entry)}</a></li>\n'
+                for entry in entries
+            )
+            if cursor is None:
+                break
+            entries, cursor = util.page_entries(after=cursor, limit=1000)
+        yield tail
+
+    return StreamingHttpResponse(stream())
+
+
+def entry_page_context(title, entry_markdown):
+    '''
+    Returns the template context of the page of an existing entry.
+    It is shared with the static export of the encyclopedia.
+    '''
+    return {
+        'title': title,
+        'entry': util.render_entry(title, entry_markdown),
+        'metadata': util.get_metadata(title, entry_markdown),
+        'backlinks': util.get_backlinks(title),
+        'search': SearchForm()
+    }
+
+
+def entry_etag(request, title):
+    '''
+    Returns the ETag of an entry page, derived from the modification
+    time and size of the entry and from the entries linking to it, or
+    None while messages wait to be shown on the page.
+    '''
+    # a page showing messages must be sent in full and not be reused later
+    if messages.get_messages(request):
+        return None
+    stat = util.get_entry_stat(title)
+    if stat is None:
+        return None
+    backlinks = zlib.crc32('\n'.join(util.get_backlinks(title)).encode('utf-8'))
+    return f'{ENTRY_PAGE_VERSION}-{stat.mtime_ns:x}-{stat.size:x}-{backlinks:x}'
+
+
+def entry_last_modified(request, title):
+    '''
+    Returns the newest modification time of the entry and of the entries
+    linking to it, which the page lists, or None while messages wait to
+    be shown on the page.
+    '''
+    if messages.get_messages(request):
+        return None
+    stat = util.get_entry_stat(title)
+    if stat is None:
+        return None
+    mtimes = [stat.mtime_ns]
+    for source in util.get_backlinks(title):
+        source_stat = util.get_entry_stat(source)
+        if source_stat is not None:
+            mtimes.append(source_stat.mtime_ns)
+    return datetime.fromtimestamp(max(mtimes) / 1e9, tz=timezone.utc)
+
+
+@condition(etag_func=entry_etag, last_modified_func=entry_last_modified)
 def entry_page(request, title):
     '''
     It renders a page that displays the contents of a requested
@@ -74,17 +198,16 @@ def entry_page(request, title):
 
     If a requested entry does not exist, the user is presented with
     an error page indicating that the requested page was not found.
+
+    Conditional requests for an unchanged entry are answered with
+    304 Not Modified before the entry is read or rendered.
     '''
     entry_markdown = util.get_entry(title)
 
     if entry_markdown is not None:
         # a requested entry does exist
-        entry_html = Markdown().convert(entry_markdown)
-        return render(request, 'encyclopedia/entry_page.html', {
-            'title': title,
-            'entry': entry_html,
-            'search': SearchForm()
-        })
+        return render(request, 'encyclopedia/entry_page.html',
+                      entry_page_context(title, entry_markdown))
     else:
         # a requested entry does not exist
         messages.error(
@@ -106,7 +229,11 @@ def search(request):
 
     If the query does not match the name of an encyclopedia entry,
     the user is taken to a search results page that displays
-    a list of all encyclopedia entries that have the query as a substring.
+    a list of all encyclopedia entries that have the query as a substring,
+    followed by the entries whose content matches the words of the query,
+    each with a snippet of its content where the words are highlighted.
+    Only the first WIKI_SEARCH_RESULTS_LIMIT results are shown.
+    If there are no such entries, titles close to the query are suggested.
     '''
     if request.method == 'POST':
         form = SearchForm(request.POST)
@@ -120,15 +247,129 @@ def search(request):
                 return redirect(reverse('entry_page', args=[title]))
             else:
                 # the query does not match the name of an encyclopedia entry
-                related_results = util.get_related_results(title)
+                related_results = util.search_entries(title)
+                # the snippets are only made for the results shown
+                shown = related_results[:getattr(settings, 'WIKI_SEARCH_RESULTS_LIMIT', 50)]
+                snippets = util.get_snippets(shown, title)
                 return render(request, 'encyclopedia/search.html', {
                     'title': title,
-                    'related_results': related_results,
+                    'count': len(related_results),
+                    'related_results': [(entry, snippets.get(entry, '')) for entry in shown],
+                    'suggestions': [] if related_results else util.suggest_entries(title),
                     'search': SearchForm()
                 })
     return redirect(reverse('index'))
 
 
+def search_suggest(request):
+    '''
+    It returns the titles starting with the query as JSON,
+    for autocompleting the search box.
+
+    Format: /search/suggest?q=QUERY&limit=LIMIT
+    '''
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+
+    return JsonResponse({
+        'query': query,
+        'results': util.complete_entries(query, limit) if query else []
+    })
+
+
+def web_search(request):
+    '''
+    It answers the queries of the Google Search pages of Project 0 from
+    the encyclopedia entries, so that they work without Internet access.
+
+    Format: /search/web?q=QUERY&start=OFFSET, where QUERY may contain
+    "exact phrases", -excluded words and words joined by OR, or the fields
+    of the advanced search: as_q (all these words), as_epq (this exact
+    phrase), as_oq (any of these words) and as_eq (none of these words).
+    The "I'm Feeling Lucky" button (btn2) goes straight to the best result.
+    With tbm=isch the images shown by the entries are searched instead.
+    '''
+    q = request.GET.get('q', '')
+    query = parse_query(
+        q,
+        all_words=request.GET.get('as_q', ''),
+        phrase=request.GET.get('as_epq', ''),
+        any_words=request.GET.get('as_oq', ''),
+        none_words=request.GET.get('as_eq', '')
+    )
+    words = query_words(query)
+    images = request.GET.get('tbm') == 'isch'
+    if images:
+        results = util.query_images(query)
+        page_size = getattr(settings, 'WIKI_IMAGE_SEARCH_PAGE_SIZE', 20)
+    else:
+        results = util.query_entries(query)
+        page_size = WEB_SEARCH_PAGE_SIZE
+
+    if 'btn2' in request.GET and results and not images:
+        return redirect(reverse('entry_page', args=[results[0]]))
+
+    try:
+        start = max(int(request.GET.get('start', 0)), 0)
+    except ValueError:
+        start = 0
+    page = results[start:start + page_size]
+
+    def page_url(offset):
+        params = request.GET.copy()
+        params['start'] = offset
+        return f'?{params.urlencode()}'
+
+    context = {
+        'q': q or ' '.join(words),
+        'count': len(results),
+        'start': start + 1,
+        'end': start + len(page),
+        'previous_url': page_url(max(start - page_size, 0)) if start > 0 else None,
+        'next_url': page_url(start + page_size) if start + page_size < len(results) else None,
+        'search': SearchForm()
+    }
+    if images:
+        return render(request, 'encyclopedia/image_search.html', dict(context, results=page))
+
+    snippets = util.get_snippets(page, ' '.join(words))
+    return render(request, 'encyclopedia/web_search.html', dict(
+        context, results=[(entry, snippets.get(entry, '')) for entry in page]))
+
+
+def image(request, path):
+    '''
+    It serves an image of the images directory, for the entries
+    showing it as ![alt](/images/NAME).
+    '''
+    directory = getattr(settings, 'WIKI_IMAGE_DIRECTORY', 'images')
+    name = posixpath.normpath(f'{directory}/{path}')
+    if not name.startswith(f'{directory}/'):
+        # the storage only refuses paths leaving all of its files
+        raise Http404(f'The image "{path}" does not exist.')
+    try:
+        return FileResponse(default_storage.open(name))
+    except (FileNotFoundError, IsADirectoryError, SuspiciousFileOperation):
+        raise Http404(f'The image "{path}" does not exist.')
+
+
+def image_thumbnail(request, pk):
+    '''
+    It serves the precomputed thumbnail of an image, or the image
+    itself if no thumbnail could be made.
+    '''
+    image = get_object_or_404(Image, pk=pk)
+    if not image.thumbnail_type:
+        return redirect(reverse('image', args=[image.path]))
+    response = HttpResponse(bytes(image.thumbnail), content_type=image.thumbnail_type)
+    # the links carry the modification time of the image
+    patch_cache_control(response, public=True, max_age=86400)
+    return response
+
+
 def new_page(request):
     '''
     It allows the user to create a new encyclopedia entry.
@@ -149,7 +390,7 @@ def new_page(request):
             title = form.cleaned_data.get('title')
             content = form.cleaned_data.get('content')
 
-            if title.lower() in [entry.lower() for entry in util.list_entries()]:
+            if util.find_entry(title) is not None:
                 messages.error(
                     request,
                     f'An encyclopedia entry with the title "{title}" already exists.'
@@ -204,11 +445,16 @@ def edit_page(request, title):
 
         if form.is_valid():
             content = form.cleaned_data['content']
-            util.save_entry(title, content)
-            messages.success(
-                request,
-                f'The encyclopedia entry "{title}" updated successfully.'
-            )
+            if util.save_entry(title, content):
+                messages.success(
+                    request,
+                    f'The encyclopedia entry "{title}" updated successfully.'
+                )
+            else:
+                messages.success(
+                    request,
+                    f'The encyclopedia entry "{title}" was not changed.'
+                )
             return redirect(reverse('entry_page', args=[title]))
         else:
             messages.error(
@@ -229,3 +475,70 @@ def random_page(request):
     entries = util.list_entries()
     entry = random.choice(entries)
     return redirect(reverse('entry_page', args=[entry]))
+
+
+def stats(request):
+    '''
+    It returns the counters of the in-process caches of this worker as JSON.
+    '''
+    return JsonResponse({
+        'render_cache': util.render_cache.stats(),
+        'coherence': util.generation.stats(),
+    })
+
+
+def history(request, title):
+    '''
+    It lists the revisions of an encyclopedia entry, newest first.
+    '''
+    return render(request, 'encyclopedia/history.html', {
+        'title': title,
+        'revisions': revisions.get_revisions(title),
+        'search': SearchForm()
+    })
+
+
+def revision(request, title, number):
+    '''
+    It renders a revision of an encyclopedia entry together with
+    the differences from the previous revision.
+    '''
+    content = revisions.get_content(title, number)
+    if content is None:
+        raise Http404(f'Revision #{number} of "{title}" does not exist.')
+
+    previous = revisions.get_content(title, number - 1) if number > 1 else ''
+    diff = difflib.unified_diff(
+        (previous or '').splitlines(),
+        content.splitlines(),
+        fromfile=f'{title} #{number - 1}',
+        tofile=f'{title} #{number}',
+        lineterm=''
+    )
+    return render(request, 'encyclopedia/revision.html', {
+        'title': title,
+        'number': number,
+        'content': content,
+        'diff': list(diff),
+        'search': SearchForm()
+    })
+
+
+def orphans(request):
+    '''
+    It lists the encyclopedia entries that no other entry links to.
+    '''
+    return render(request, 'encyclopedia/orphans.html', {
+        'entries': util.get_orphans(),
+        'search': SearchForm()
+    })
+
+
+def wanted(request):
+    '''
+    It lists the titles that entries link to but that do not exist yet.
+    '''
+    return render(request, 'encyclopedia/wanted.html', {
+        'wanted': util.get_wanted(),
+        'search': SearchForm()
+    })
@@ -47,6 +47,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'encyclopedia.coherence.CoherenceMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -81,6 +82,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # a file rather than the default in-memory database, which the
+        # processes of the static export cannot share, for its tests
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
     }
 }
 
@@ -122,3 +126,51 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Encyclopedia
+
+# Storage of the entries: encyclopedia.backends.FileSystemBackend keeps one
+# Markdown file per entry, encyclopedia.backends.SQLiteBackend keeps them in
+# a SQLite database with full-text search (see import_markdown_entries).
+# The file system backend accepts {'sharded': True} to spread the files over
+# entries/ab/cd/ subdirectories (see shard_entries)
+WIKI_ENTRY_BACKEND = 'encyclopedia.backends.FileSystemBackend'
+WIKI_ENTRY_BACKEND_OPTIONS = {}
+
+# Number of rendered entry pages kept in memory by each process
+WIKI_RENDER_CACHE_SIZE = 256
+
+# Alias of a cache in CACHES shared by all processes for rendered pages,
+# or None to use only the in-process cache
+WIKI_RENDER_CACHE_ALIAS = None
+
+# Snapshot of the full-text search index, its journal is kept next to it
+WIKI_SEARCH_INDEX_PATH = os.path.join(BASE_DIR, 'search_index.json')
+
+# Number of journalled updates after which the snapshot is rewritten
+WIKI_SEARCH_JOURNAL_LIMIT = 1000
+
+# Maximum number of typos between a failed search and a suggested title
+WIKI_SUGGEST_MAX_DISTANCE = 2
+
+# Every n-th revision of an entry stores its full content instead of a delta
+WIKI_REVISION_SNAPSHOT_INTERVAL = 20
+
+# Shared counter bumped on every save so that other worker processes
+# refresh their caches
+WIKI_GENERATION_PATH = os.path.join(BASE_DIR, '.wiki-generation')
+
+# Number of entries listed per page of the index
+WIKI_INDEX_PAGE_SIZE = 200
+
+# Directory of the default storage holding the images entries refer to
+# as ![alt](/images/NAME "caption"), see build_image_index
+WIKI_IMAGE_DIRECTORY = 'images'
+
+# Largest width and height of the precomputed image thumbnails, which
+# require Pillow
+WIKI_THUMBNAIL_SIZE = 200
+
+# Number of images per page of the image search
+WIKI_IMAGE_SEARCH_PAGE_SIZE = 20
@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Category
+
+
+CATEGORIES_CACHE_KEY = 'auctions:categories'
+
+# bounds how long another process may show outdated counts, since the
+# signals only clear the cache of the process that made the change
+# unless CACHES points to a shared cache
+CATEGORIES_CACHE_TIMEOUT = 300
+
+
+def get_categories():
+    '''
+    Returns all categories with their numbers of active auctions, from
+    the cache if possible, otherwise with a single aggregate query.
+    '''
+    categories = cache.get(CATEGORIES_CACHE_KEY)
+    if categories is None:
+        categories = list(Category.objects.annotate(
+            active_auctions=Count('auction_category', filter=Q(auction_category__active=True))
+        ).order_by('category_name'))
+        cache.set(CATEGORIES_CACHE_KEY, categories, CATEGORIES_CACHE_TIMEOUT)
+    return categories
+
+
+def clear_categories():
+    cache.delete(CATEGORIES_CACHE_KEY)
+
+
+def categories(request):
+    '''
+    Adds the categories shown in the sidebar of every page to the context.
+    '''
+    return {'categories': get_categories()}
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Auction
+
+
+def get_state(auction_id):
+    '''
+    Returns what the event streams show of an auction: its current bid,
+    number of bids and whether it is still open, or None if it was deleted.
+    '''
+    state = Auction.objects.filter(pk=auction_id).values(
+        'current_bid', 'bid_count', 'active').first()
+    if state is not None:
+        state['current_bid'] = str(state['current_bid']) if state['current_bid'] is not None else None
+    return state
+
+
+class AuctionEvents:
+    '''
+    Fans out the state of auctions to the event streams of this process.
+
+    Each stream has a queue of its own holding only the latest state, so a
+    slow client skips intermediate bids instead of falling behind. The state
+    of an auction is read once per change and handed to all of its streams:
+    bids accepted by this process notify it when they are committed, and
+    one task per watched auction reads it every `AUCTIONS_EVENTS_INTERVAL`
+    seconds to notice the bids accepted by other processes.
+    '''
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._pollers = {}
+        self._states = {}
+
+    def _interval(self):
+        if self.interval is not None:
+            return self.interval
+        return getattr(settings, 'AUCTIONS_EVENTS_INTERVAL', 2)
+
+    def subscribe(self, auction_id):
+        '''
+        Returns a queue receiving the changes of the auction, holding at
+        first the state last published to its other streams, if any. It
+        must be called from the event loop of the stream, and the queue
+        released with `unsubscribe` once the stream ends.
+        '''
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            if auction_id in self._states:
+                queue.put_nowait(self._states[auction_id])
+            self._streams.setdefault(auction_id, set()).add((loop, queue))
+            if auction_id not in self._pollers:
+                self._pollers[auction_id] = loop.create_task(self._poll(auction_id))
+        return queue
+
+    def unsubscribe(self, auction_id, queue):
+        with self._lock:
+            streams = self._streams.get(auction_id, set())
+            streams.difference_update({stream for stream in streams if stream[1] is queue})
+            if not streams:
+                self._streams.pop(auction_id, None)
+                self._states.pop(auction_id, None)
+                poller = self._pollers.pop(auction_id, None)
+                if poller is not None:
+                    poller.cancel()
+
+    def watchers(self, auction_id=None):
+        with self._lock:
+            if auction_id is not None:
+                return len(self._streams.get(auction_id, ()))
+            return sum(len(streams) for streams in self._streams.values())
+
+    @staticmethod
+    def _offer(queue, state):
+        # keep only the latest state for a stream that has not caught up
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(state)
+
+    def publish(self, auction_id, state):
+        '''
+        Hands a state of the auction to its streams, unless they were
+        already given the same. Safe to call from any thread.
+        '''
+        with self._lock:
+            if self._states.get(auction_id) == state or auction_id not in self._streams:
+                return
+            self._states[auction_id] = state
+            streams = list(self._streams[auction_id])
+        for loop, queue in streams:
+            loop.call_soon_threadsafe(self._offer, queue, state)
+
+    def notify(self, auction_id):
+        '''
+        Reads the state of a changed auction and publishes it, if this
+        process streams it to anyone.
+        '''
+        if self.watchers(auction_id):
+            self.publish(auction_id, get_state(auction_id))
+
+    async def _poll(self, auction_id):
+        while True:
+            self.publish(auction_id, await sync_to_async(get_state)(auction_id))
+            await asyncio.sleep(self._interval())
+
+
+auction_events = AuctionEvents()
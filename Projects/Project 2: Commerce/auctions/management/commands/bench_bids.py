@@ -0,0 +1,119 @@
+import json
+import platform
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from auctions.models import Auction, Bid, Category, User
+
+
+def measure(function, arguments, reset=None):
+    '''
+    Calls the function once per argument and returns statistics of the
+    calls in milliseconds, calling `reset` untimed before each of them.
+    '''
+    timings = []
+    for argument in arguments:
+        if reset is not None:
+            reset(argument)
+        start = time.perf_counter()
+        function(argument)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'mean_ms': round(statistics.mean(timings), 4),
+        'p50_ms': round(timings[len(timings) // 2], 4),
+        'p95_ms': round(timings[int(len(timings) * 0.95)], 4),
+        'calls': len(timings),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Times finding the winner of auctions holding many bids, from the '
+            'denormalized highest bidder and from the bids, and prints the results as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bids', type=int, default=100000,
+                            help='Number of bids on each auction.')
+        parser.add_argument('--auctions', type=int, default=3,
+                            help='Number of auctions.')
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Number of timed calls per operation.')
+        parser.add_argument('--output', help='File to write the JSON results to instead of stdout.')
+
+    def create_auctions(self, count, bids):
+        users = [User.objects.create_user(f'bidder{i}', f'bidder{i}@example.com', 'password')
+                 for i in range(10)]
+        category = Category.objects.create(category_name='Benchmark')
+        auctions = []
+        for i in range(count):
+            auction = Auction.objects.create(
+                title=f'Auction {i}', creator=users[0], category=category, starting_bid=1)
+            # rising amounts, as place_bid only accepts bids beating the current one
+            Bid.objects.bulk_create(
+                (Bid(auction=auction, user=users[j % len(users)], amount=Decimal(j + 100) / 100)
+                 for j in range(bids)),
+                batch_size=5000
+            )
+            last = Bid.objects.filter(auction=auction).order_by('-amount').first()
+            Auction.objects.filter(pk=auction.pk).update(
+                current_bid=last.amount, highest_bidder=last.user)
+            auctions.append(auction.pk)
+        return auctions
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            start = time.perf_counter()
+            auctions = self.create_auctions(options['auctions'], options['bids'])
+            generate = time.perf_counter() - start
+            calls = [auctions[i % len(auctions)] for i in range(options['repeat'])]
+
+            def reopen(pk):
+                Auction.objects.filter(pk=pk).update(active=True, buyer=None)
+
+            highest_bid = Bid.objects.filter(auction=auctions[0]).order_by('-amount')
+            report = {
+                'environment': {
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': connection.vendor,
+                    'platform': platform.platform(),
+                },
+                'auctions': len(auctions),
+                'bids_per_auction': options['bids'],
+                'generate_s': round(generate, 3),
+                # what closing reads now
+                'denormalized_highest_bidder': measure(
+                    lambda pk: Auction.objects.values_list('highest_bidder', flat=True).get(pk=pk),
+                    calls),
+                # the same answer from the bids through the (auction, amount) index
+                'indexed_highest_bid': measure(
+                    lambda pk: Bid.objects.filter(auction=pk).order_by('-amount')
+                    .values_list('user', flat=True).first(),
+                    calls),
+                # what closing read before, the latest bid rather than the highest
+                'latest_bid': measure(
+                    lambda pk: Bid.objects.filter(auction=pk)
+                    .values_list('user', flat=True).last(),
+                    calls),
+                'close': measure(lambda pk: Auction.objects.get(pk=pk).close(), calls, reset=reopen),
+                'indexed_highest_bid_plan': highest_bid.explain(),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            sys.stdout.write(output + '\n')
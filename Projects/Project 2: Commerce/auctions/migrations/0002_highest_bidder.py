@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_highest_bidders(apps, schema_editor):
+    Auction = apps.get_model('auctions', 'Auction')
+    Bid = apps.get_model('auctions', 'Bid')
+    for auction in Auction.objects.filter(current_bid__isnull=False):
+        bid = Bid.objects.filter(auction=auction).order_by('-amount', 'id').first()
+        if bid is not None:
+            auction.highest_bidder_id = bid.user_id
+            auction.save(update_fields=['highest_bidder'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auction',
+            name='highest_bidder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='leading_auctions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['auction', 'amount'], name='auctions_bi_auction_bac253_idx'),
+        ),
+        migrations.RunPython(set_highest_bidders, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.dispatch import Signal
 from django.utils import timezone
 
 
+# sent with the auction_id whenever a bid is accepted, which updates the
+# auction without sending post_save
+auction_changed = Signal()
+
+
 class User(AbstractUser):
     def __str__(self):
         return f'{self.username}'
@@ -17,7 +24,10 @@ class Category(models.Model):
 
     @property
     def count_active_auctions(self):
-        return Auction.objects.filter(category=self).count()
+        # annotated by auctions.context_processors.get_categories
+        if hasattr(self, 'active_auctions'):
+            return self.active_auctions
+        return Auction.objects.filter(category=self, active=True).count()
 
 
 class Auction(models.Model):
@@ -29,9 +39,50 @@ class Auction(models.Model):
     starting_bid = models.DecimalField(max_digits=7, decimal_places=2, validators=[MinValueValidator(0.01)])
     current_bid = models.DecimalField(max_digits=7, decimal_places=2, validators=[MinValueValidator(0.01)], blank=True, null=True)
     buyer = models.ForeignKey(User, on_delete=models.PROTECT, null=True)
+    # the user who placed current_bid, kept up to date by place_bid
+    highest_bidder = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True,
+                                       related_name='leading_auctions')
+    bid_count = models.PositiveIntegerField(default=0)
     watchers = models.ManyToManyField(User, related_name='watchlist', blank=True)
     active = models.BooleanField(default=True)
 
+    def place_bid(self, user, amount):
+        '''
+        Places a bid if the auction is active and the amount is at least
+        the starting bid and more than the current bid. The check and the
+        new current bid are a single conditional UPDATE, so of concurrent
+        bids only those beating the stored bid at the time are accepted.
+        Returns the new Bid, or None if the bid was refused.
+        '''
+        with transaction.atomic():
+            accepted = Auction.objects.filter(
+                Q(current_bid__isnull=True) | Q(current_bid__lt=amount),
+                pk=self.pk,
+                active=True,
+                starting_bid__lte=amount
+            ).update(current_bid=amount, highest_bidder=user, bid_count=F('bid_count') + 1)
+            if not accepted:
+                return None
+            bid = Bid.objects.create(auction=self, user=user, amount=amount)
+        self.current_bid = amount
+        self.highest_bidder = user
+        auction_changed.send(sender=Auction, auction_id=self.pk)
+        return bid
+
+    def close(self):
+        '''
+        Closes the auction and makes the highest bidder its buyer, read
+        from the auction itself rather than searched among the bids.
+        '''
+        with transaction.atomic():
+            # writing first takes the lock, so that no bid is accepted
+            # between reading the highest bidder and closing
+            Auction.objects.filter(pk=self.pk).update(active=False)
+            self.refresh_from_db(fields=['current_bid', 'highest_bidder'])
+            self.active = False
+            self.buyer_id = self.highest_bidder_id
+            self.save(update_fields=['active', 'buyer'])
+
     def __str__(self):
         return f'Auction #{self.id}: {self.title} ({self.creator})'
 
@@ -42,6 +93,9 @@ class Bid(models.Model):
     amount = models.DecimalField(max_digits=7, decimal_places=2)
     date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['auction', 'amount'])]
+
     def __str__(self):
         return f'Bid #{self.id}: {self.amount} on {self.auction.title} by {self.user.username}'
 
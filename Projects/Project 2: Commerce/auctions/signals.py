@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .context_processors import clear_categories
+from .events import auction_events
+from .models import Auction, Category, auction_changed
+
+
+@receiver([post_save, post_delete], sender=Auction)
+@receiver([post_save, post_delete], sender=Category)
+def categories_changed(sender, **kwargs):
+    '''
+    Drops the cached categories when an auction or a category changes,
+    as the number of active auctions of a category may have changed.
+    '''
+    clear_categories()
+
+
+@receiver(auction_changed, sender=Auction)
+@receiver(post_save, sender=Auction)
+def auction_updated(sender, auction_id=None, instance=None, **kwargs):
+    '''
+    Streams the new state of an auction to its watchers once the change
+    is committed.
+    '''
+    auction_id = auction_id if instance is None else instance.pk
+    transaction.on_commit(lambda: auction_events.notify(auction_id))
@@ -0,0 +1,36 @@
+//
+// Live updates of the auction page from the Server-Sent Events stream
+// of the auction, instead of reloading the page to see new bids.
+//
+
+window.addEventListener('DOMContentLoaded', event => {
+
+    const price = document.getElementById('auction-price');
+    if (!price || !window.EventSource || price.dataset.active !== 'true') {
+        return;
+    }
+
+    const source = new EventSource(price.dataset.eventsUrl);
+    source.addEventListener('auction', event => {
+        const state = JSON.parse(event.data);
+
+        if (state.current_bid !== null) {
+            price.textContent = '€' + state.current_bid;
+            const currentPrice = document.getElementById('auction-current-price');
+            if (currentPrice) {
+                currentPrice.textContent = ' €' + state.current_bid;
+            }
+        }
+        const bidCount = document.getElementById('auction-bid-count');
+        if (bidCount) {
+            bidCount.textContent = state.bid_count + (state.bid_count === 1 ? ' bid' : ' bids');
+        }
+
+        if (!state.active) {
+            // the page shows the winner once the auction is closed
+            source.close();
+            window.location.reload();
+        }
+    });
+
+});
@@ -1,3 +1,331 @@
-from django.test import TestCase
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .context_processors import get_categories
+from .events import AuctionEvents
+from .models import Auction, Bid, Category, Image, User
+
+
+class ListingQueryCountTests(TestCase):
+    '''
+    The listing pages must load their auctions with a fixed number of
+    queries, however many auctions they show.
+    '''
+
+    def setUp(self):
+        self.user = User.objects.create_user('bidder', 'bidder@example.com', 'password')
+        self.category = Category.objects.create(category_name='Books')
+        self.client.force_login(self.user)
+
+    def add_auctions(self, count):
+        for i in range(count):
+            auction = Auction.objects.create(
+                title=f'Auction {i}',
+                creator=self.user,
+                category=self.category,
+                starting_bid=10
+            )
+            Image.objects.create(auction=auction, image=f'images/{i}-front.png')
+            Image.objects.create(auction=auction, image=f'images/{i}-back.png')
+            if i % 2:
+                auction.watchers.add(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def assertConstantQueries(self, url):
+        self.add_auctions(2)
+        few, _ = self.count_queries(url)
+        self.add_auctions(20)
+        many, response = self.count_queries(url)
+        self.assertEqual(few, many)
+        return response
+
+    def test_active_auctions(self):
+        response = self.assertConstantQueries(reverse('active_auctions_view'))
+        auctions = response.context['auctions']
+        self.assertEqual(len(auctions), 22)
+        self.assertEqual(sum(auction.is_watched for auction in auctions), 11)
+        self.assertTrue(all(auction.image.image.name.endswith('-front.png') for auction in auctions))
+
+    def test_watchlist(self):
+        response = self.assertConstantQueries(reverse('watchlist_view'))
+        auctions = response.context['auctions']
+        self.assertEqual(len(auctions), 11)
+        self.assertTrue(all(auction.is_watched for auction in auctions))
+
+    def test_category_details(self):
+        response = self.assertConstantQueries(
+            reverse('category_details_view', args=[self.category.category_name]))
+        self.assertEqual(response.context['auctions_count'], 22)
+
+    def test_anonymous_user_watches_nothing(self):
+        self.add_auctions(3)
+        self.client.logout()
+        response = self.client.get(reverse('active_auctions_view'))
+        self.assertFalse(any(auction.is_watched for auction in response.context['auctions']))
+
+
+class CategorySidebarTests(TestCase):
+    '''
+    The categories of the sidebar come from the cache, which is cleared
+    whenever an auction or a category changes.
+    '''
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.books = Category.objects.create(category_name='Books')
+        self.games = Category.objects.create(category_name='Games')
+        self.auction = Auction.objects.create(
+            title='Novel', creator=self.user, category=self.books, starting_bid=5)
+        Auction.objects.create(
+            title='Atlas', creator=self.user, category=self.books, starting_bid=5, active=False)
+
+    def counts(self):
+        return {category.category_name: category.count_active_auctions
+                for category in get_categories()}
+
+    def test_counts_only_active_auctions(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.counts(), {'Books': 1, 'Games': 0})
+
+    def test_warm_cache_costs_no_queries(self):
+        get_categories()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), {'Books': 1, 'Games': 0})
+
+    def test_changes_clear_the_cache(self):
+        get_categories()
+        self.auction.category = self.games
+        self.auction.save()
+        self.assertEqual(self.counts(), {'Books': 0, 'Games': 1})
+
+        Category.objects.create(category_name='Art')
+        self.assertEqual(self.counts(), {'Art': 0, 'Books': 0, 'Games': 1})
+
+        self.auction.delete()
+        self.assertEqual(self.counts(), {'Art': 0, 'Books': 0, 'Games': 0})
+
+    def test_pages_use_the_cached_sidebar(self):
+        self.client.get(reverse('login'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('login'))
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, 'Books')
+
+
+class BidTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.bidder = User.objects.create_user('bidder', 'bidder@example.com', 'password')
+        category = Category.objects.create(category_name='Books')
+        self.auction = Auction.objects.create(
+            title='Novel', creator=self.seller, category=category, starting_bid=10)
+
+    def test_bid_must_reach_the_starting_bid(self):
+        self.assertIsNone(self.auction.place_bid(self.bidder, Decimal('9.99')))
+        self.assertIsNotNone(self.auction.place_bid(self.bidder, Decimal('10')))
+
+    def test_bid_must_beat_the_current_bid(self):
+        self.auction.place_bid(self.bidder, Decimal('12'))
+        self.assertIsNone(self.auction.place_bid(self.seller, Decimal('12')))
+        self.assertIsNotNone(self.auction.place_bid(self.seller, Decimal('12.01')))
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_bid, Decimal('12.01'))
+        self.assertEqual(Bid.objects.count(), 2)
+
+    def test_closed_auction_refuses_bids(self):
+        self.auction.active = False
+        self.auction.save()
+        self.assertIsNone(self.auction.place_bid(self.bidder, Decimal('50')))
+
+    def test_close_makes_the_highest_bidder_the_buyer(self):
+        self.auction.place_bid(self.bidder, Decimal('20'))
+        # a lower bid recorded later, which closing must not pick
+        Bid.objects.create(auction=self.auction, user=self.seller, amount=Decimal('15'))
+        self.auction.close()
+        self.auction.refresh_from_db()
+        self.assertFalse(self.auction.active)
+        self.assertEqual(self.auction.buyer, self.bidder)
+        self.assertIsNone(self.auction.place_bid(self.seller, Decimal('30')))
+
+    def test_close_without_bids(self):
+        self.auction.close()
+        self.auction.refresh_from_db()
+        self.assertFalse(self.auction.active)
+        self.assertIsNone(self.auction.buyer)
+
+    def test_refused_bid_shows_the_current_bid(self):
+        Auction.objects.filter(pk=self.auction.pk).update(current_bid=Decimal('30'))
+        self.client.force_login(self.bidder)
+        response = self.client.post(reverse('auction_bid', args=[self.auction.id]), {'amount': '20'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['auction'].current_bid, Decimal('30'))
+
+
+class ConcurrentBidTests(TransactionTestCase):
+    '''
+    Fires many bids at one auction from a pool of threads, each with its
+    own database connection, and checks that no accepted bid was lost.
+    '''
+
+    bids = 2000
+    workers = 16
+    min_bids_per_second = 20
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'bidder{i}', f'bidder{i}@example.com', 'password')
+                      for i in range(self.workers)]
+        category = Category.objects.create(category_name='Books')
+        self.auction = Auction.objects.create(
+            title='Novel', creator=self.users[0], category=category, starting_bid=1)
+
+    def place(self, i):
+        try:
+            # rising amounts with some jitter, so that many bids are
+            # accepted and many are beaten by a concurrent one
+            amount = Decimal(i + (i * 7919) % 50) / 10 + 1
+            auction = Auction.objects.get(pk=self.auction.pk)
+            return amount, auction.place_bid(self.users[i % self.workers], amount) is not None
+        finally:
+            connections.close_all()
+
+    def test_parallel_bids(self):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.place, range(self.bids)))
+        elapsed = time.perf_counter() - start
+
+        accepted = [amount for amount, ok in results if ok]
+        bids = list(Bid.objects.filter(auction=self.auction).order_by('id')
+                    .values_list('amount', flat=True))
+        self.auction.refresh_from_db()
+
+        self.assertEqual(len(bids), len(accepted))
+        self.assertEqual(sorted(bids), sorted(accepted))
+        # every accepted bid beat the one before it
+        self.assertTrue(all(a < b for a, b in zip(bids, bids[1:])))
+        self.assertEqual(self.auction.current_bid, max(amount for amount, _ in results))
+        self.assertEqual(self.auction.current_bid, bids[-1])
+        self.assertEqual(self.auction.highest_bidder_id,
+                         Bid.objects.filter(auction=self.auction).latest('amount').user_id)
+        # a loose bound, far below the usual rate, that still catches
+        # writers serialized by lock timeouts rather than by the database
+        self.assertGreater(self.bids / elapsed, self.min_bids_per_second)
+
+
+class AuctionEventsTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('seller', 'seller@example.com', 'password')
+        category = Category.objects.create(category_name='Books')
+        self.auction = Auction.objects.create(
+            title='Novel', creator=user, category=category, starting_bid=10)
+
+    async def test_one_read_fans_out_to_every_watcher(self):
+        events = AuctionEvents(interval=60)
+        queues = [events.subscribe(self.auction.pk) for _ in range(1000)]
+        # the state the poller reads first
+        state = await asyncio.wait_for(queues[0].get(), 5)
+        self.assertEqual(state['bid_count'], 0)
+
+        await sync_to_async(Auction.objects.filter(pk=self.auction.pk).update)(bid_count=5)
+
+        def notify():
+            with CaptureQueriesContext(connection) as queries:
+                events.notify(self.auction.pk)
+            return len(queries)
+
+        self.assertEqual(await sync_to_async(notify)(), 1)
+        await asyncio.sleep(0)
+        states = [queue.get_nowait() for queue in queues]
+        self.assertTrue(all(state['bid_count'] == 5 for state in states))
+
+        for queue in queues:
+            events.unsubscribe(self.auction.pk, queue)
+        self.assertEqual(events.watchers(), 0)
+
+    def test_unwatched_auction_is_not_read(self):
+        with self.assertNumQueries(0):
+            AuctionEvents().notify(self.auction.pk)
+
+    async def test_new_watcher_gets_the_last_published_state(self):
+        events = AuctionEvents(interval=60)
+        first = events.subscribe(self.auction.pk)
+        state = {'current_bid': '12.50', 'bid_count': 1, 'active': True}
+        events.publish(self.auction.pk, state)
+        await asyncio.sleep(0)
+        # published between reading the state and subscribing, and not again
+        second = events.subscribe(self.auction.pk)
+        self.assertEqual(second.get_nowait(), state)
+
+        for queue in (first, second):
+            events.unsubscribe(self.auction.pk, queue)
+
+
+@override_settings(AUCTIONS_EVENTS_INTERVAL=60)
+class AuctionEventStreamTests(TransactionTestCase):
+    '''
+    Follows the event stream of an auction while bids are placed and
+    the auction is closed.
+    '''
+
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.bidder = User.objects.create_user('bidder', 'bidder@example.com', 'password')
+        category = Category.objects.create(category_name='Books')
+        self.auction = Auction.objects.create(
+            title='Novel', creator=self.seller, category=category, starting_bid=10)
+
+    async def next_event(self, stream):
+        while True:
+            chunk = await asyncio.wait_for(stream.__anext__(), 5)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('event: auction'):
+                return json.loads(chunk.split('data: ', 1)[1])
+
+    async def test_stream(self):
+        response = await AsyncClient().get(reverse('auction_events', args=[self.auction.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content.__aiter__()
+
+        state = await self.next_event(stream)
+        self.assertEqual(state, {'current_bid': None, 'bid_count': 0, 'active': True})
+
+        await sync_to_async(self.auction.place_bid)(self.bidder, Decimal('12.50'))
+        state = await self.next_event(stream)
+        self.assertEqual(state, {'current_bid': '12.50', 'bid_count': 1, 'active': True})
+
+        await sync_to_async(self.auction.close)()
+        state = await self.next_event(stream)
+        self.assertFalse(state['active'])
+        with self.assertRaises(StopAsyncIteration):
+            await stream.__anext__()
+
+    async def test_missing_auction(self):
+        response = await AsyncClient().get(reverse('auction_events', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_wsgi_sends_one_event(self):
+        response = self.client.get(reverse('auction_events', args=[self.auction.pk]))
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = response.content.decode()
+        # the browser reconnects after the polling interval
+        self.assertTrue(content.startswith('retry: 60000\n\n'))
+        self.assertEqual(content.count('event: auction'), 1)
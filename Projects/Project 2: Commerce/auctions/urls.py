@@ -14,6 +14,7 @@ urlpatterns = [
     path('auction/watchlist/<int:auction_id>/edit/<str:reverse_method>', views.watchlist_edit, name='watchlist_edit'),
     path('auction/<str:auction_id>', views.auction_details_view, name='auction_details_view'),
     path('auction/<str:auction_id>/bid', views.auction_bid, name='auction_bid'),
+    path('auction/<int:auction_id>/events', views.auction_events_view, name='auction_events'),
     path('auction/<str:auction_id>/close', views.auction_close, name='auction_close'),
     path('auction/<str:auction_id>/comment', views.auction_comment, name='auction_comment'),
     path('categories', views.categories_view, name='categories_view'),
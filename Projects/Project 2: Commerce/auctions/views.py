@@ -1,15 +1,26 @@
-from decimal import Decimal
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
 from django import forms
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
 from django.db import IntegrityError
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db.models import Exists, OuterRef, Subquery
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import render
 from django.urls import reverse
 
+from .events import auction_events, get_state
 from .models import Auction, Bid, Comment, Category, Image, User
 
 
+# seconds between comments keeping idle event streams open
+EVENTS_KEEPALIVE = 15
+
+
 class AuctionForm(forms.ModelForm):
     '''
     A ModelForm class for creating a new auction listing.
@@ -76,6 +87,29 @@ class ImageForm(forms.ModelForm):
         self.visible_fields()[0].field.widget.attrs['class'] = 'form-control'
 
 
+def auction_listing(auctions, user):
+    '''
+    Returns the auctions of a listing page with their first image as
+    `image` and whether the user watches them as `is_watched`, loaded
+    with a fixed number of queries whatever the number of auctions.
+    '''
+    auctions = list(auctions.annotate(
+        is_watched=Exists(Auction.watchers.through.objects.filter(
+            auction=OuterRef('pk'), user=user.pk)),
+        # looked up through the index on the auction of the images for the
+        # listed auctions only, rather than grouping the whole image table
+        first_image=Subquery(Image.objects.filter(
+            auction=OuterRef('pk')).order_by('id').values('image')[:1])
+    ))
+
+    for auction in auctions:
+        auction.image = None
+        if auction.first_image:
+            auction.image = Image(auction=auction, image=auction.first_image)
+
+    return auctions
+
+
 def index(request):
     '''
     The default route which lists all of the currently active auction listings.
@@ -97,13 +131,10 @@ def login_view(request):
             return HttpResponseRedirect(reverse('index'))
         else:
             return render(request, 'auctions/login.html', {
-                'message': 'Invalid username and/or password.',
-                'categories': Category.objects.all()
+                'message': 'Invalid username and/or password.'
             })
     else:
-        return render(request, 'auctions/login.html', {
-            'categories': Category.objects.all()
-        })
+        return render(request, 'auctions/login.html')
 
 
 def logout_view(request):
@@ -121,8 +152,7 @@ def register(request):
         confirmation = request.POST['confirmation']
         if password != confirmation:
             return render(request, 'auctions/register.html', {
-                'message': 'Passwords must match.',
-                'categories': Category.objects.all()
+                'message': 'Passwords must match.'
             })
 
         # Attempt to create new user
@@ -131,15 +161,12 @@ def register(request):
             user.save()
         except IntegrityError:
             return render(request, 'auctions/register.html', {
-                'message': 'Username already taken.',
-                'categories': Category.objects.all()
+                'message': 'Username already taken.'
             })
         login(request, user)
         return HttpResponseRedirect(reverse('index'))
     else:
-        return render(request, 'auctions/register.html', {
-            'categories': Category.objects.all()
-        })
+        return render(request, 'auctions/register.html')
 
 
 @login_required
@@ -166,20 +193,17 @@ def auction_create(request):
                     new_image.save()
 
             return render(request, 'auctions/auction_create.html', {
-                'categories': Category.objects.all(),
                 'auction_form': AuctionForm(),
                 'image_form': ImageFormSet(queryset=Image.objects.none()),
                 'success': True
             })
         else:
             return render(request, 'auctions/auction_create.html', {
-                'categories': Category.objects.all(),
                 'auction_form': AuctionForm(),
                 'image_form': ImageFormSet(queryset=Image.objects.none())
             })
     else:
         return render(request, 'auctions/auction_create.html', {
-            'categories': Category.objects.all(),
             'auction_form': AuctionForm(),
             'image_form': ImageFormSet(queryset=Image.objects.none())
         })
@@ -194,16 +218,9 @@ def active_auctions_view(request):
         auctions = Auction.objects.filter(active=True, category=category_name)
     else:
         auctions = Auction.objects.filter(active=True)
-
-    for auction in auctions:
-        auction.image = auction.get_images.first()
-        if request.user in auction.watchers.all():
-            auction.is_watched = True
-        else:
-            auction.is_watched = False
+    auctions = auction_listing(auctions, request.user)
 
     return render(request, "auctions/index.html", {
-        'categories': Category.objects.all(),
         'auctions': auctions,
         'title': 'Active Auctions'
     })
@@ -214,18 +231,9 @@ def watchlist_view(request):
     '''
     It renders a page that displays all of the listings that a user has added to their watchlist.
     '''
-    auctions = request.user.watchlist.all()
-
-    for auction in auctions:
-        auction.image = auction.get_images.first()
-
-        if request.user in auction.watchers.all():
-            auction.is_watched = True
-        else:
-            auction.is_watched = False
+    auctions = auction_listing(request.user.watchlist.all(), request.user)
 
     return render(request, 'auctions/index.html', {
-        'categories': Category.objects.all(),
         'auctions': auctions,
         'title': 'Watchlist'
     })
@@ -264,7 +272,6 @@ def auction_details_view(request, auction_id):
         auction.is_watched = False
 
     return render(request, 'auctions/auction.html', {
-        'categories': Category.objects.all(),
         'auction': auction,
         'images': auction.get_images.all(),
         'bid_form': BidForm(),
@@ -279,21 +286,14 @@ def auction_bid(request, auction_id):
     It allows the signed in users to bid on the item.
     '''
     auction = Auction.objects.get(id=auction_id)
-    amount = Decimal(request.POST['amount'])
-
-    if amount >= auction.starting_bid and (auction.current_bid is None or amount > auction.current_bid):
-        auction.current_bid = amount
-        form = BidForm(request.POST)
-        new_bid = form.save(commit=False)
-        new_bid.auction = auction
-        new_bid.user = request.user
-        new_bid.save()
-        auction.save()
+    form = BidForm(request.POST)
 
+    if form.is_valid() and auction.place_bid(request.user, form.cleaned_data['amount']):
         return HttpResponseRedirect(reverse('auction_details_view', args=[auction_id]))
     else:
+        # show the bid that beat this one
+        auction.refresh_from_db()
         return render(request, 'auctions/auction.html', {
-            'categories': Category.objects.all(),
             'auction': auction,
             'images': auction.get_images.all(),
             'form': BidForm(),
@@ -309,9 +309,7 @@ def auction_close(request, auction_id):
     auction = Auction.objects.get(id=auction_id)
 
     if request.user == auction.creator:
-        auction.active = False
-        auction.buyer = Bid.objects.filter(auction=auction).last().user
-        auction.save()
+        auction.close()
 
         return HttpResponseRedirect(reverse('auction_details_view', args=[auction_id]))
     else:
@@ -320,6 +318,53 @@ def auction_close(request, auction_id):
         return HttpResponseRedirect(reverse('watchlist_view'))
 
 
+async def auction_events_view(request, auction_id):
+    '''
+    It streams the current bid, the number of bids and whether the auction
+    is still open as Server-Sent Events, first on connecting and then on
+    every change, so that the auction page updates without reloading.
+    It is meant to be served through commerce/asgi.py. Under WSGI, where a
+    stream would hold a worker thread until the auction closes, it sends
+    the current state only and the browser polls by reconnecting.
+    '''
+    state = await sync_to_async(get_state)(auction_id)
+    if state is None:
+        raise Http404(f'Auction #{auction_id} does not exist.')
+
+    if not isinstance(request, ASGIRequest):
+        retry = getattr(settings, 'AUCTIONS_EVENTS_INTERVAL', 2) * 1000
+        response = HttpResponse(
+            f'retry: {retry}\n\nevent: auction\ndata: {json.dumps(state)}\n\n',
+            content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    async def stream(state):
+        # given the latest state published to the other streams, if any,
+        # so that no change made since the state was read is missed
+        queue = auction_events.subscribe(auction_id)
+        try:
+            yield 'retry: 5000\n\n'
+            while state is not None:
+                yield f'event: auction\ndata: {json.dumps(state)}\n\n'
+                if not state['active']:
+                    break
+                sent = state
+                while state == sent:
+                    try:
+                        state = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE)
+                    except asyncio.TimeoutError:
+                        yield ': keep-alive\n\n'
+        finally:
+            auction_events.unsubscribe(auction_id, queue)
+
+    response = StreamingHttpResponse(stream(state), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # ask proxies such as nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def auction_comment(request, auction_id):
     '''
     It allows the signed in users to add comments to the listing page.
@@ -337,9 +382,7 @@ def categories_view(request):
     '''
     It renders a list of all listing categories.
     '''
-    return render(request, 'auctions/categories.html', {
-        'categories': Category.objects.all()
-    })
+    return render(request, 'auctions/categories.html')
 
 
 def category_details_view(request, category_name):
@@ -348,14 +391,10 @@ def category_details_view(request, category_name):
     displays all of the active listings in that category.
     '''
     category = Category.objects.get(category_name=category_name)
-    auctions = Auction.objects.filter(category=category)
-
-    for auction in auctions:
-        auction.image = auction.get_images.first()
+    auctions = auction_listing(Auction.objects.filter(category=category, active=True), request.user)
 
     return render(request, 'auctions/auctions_category.html', {
-        'categories': Category.objects.all(),
         'auctions': auctions,
-        'auctions_count': auctions.count(),
+        'auctions_count': len(auctions),
         'title': category.category_name
     })
@@ -2,6 +2,9 @@
 ASGI config for commerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn commerce.asgi:application``, for
+the live bid updates of /auction/<id>/events: each open stream then costs a
+coroutine rather than a worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -31,7 +31,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'auctions',
+    'auctions.apps.AuctionsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -63,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'auctions.context_processors.categories',
             ],
         },
     },
@@ -78,6 +79,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # wait for concurrent writers instead of failing at once
+        'OPTIONS': {'timeout': 30},
+        # a file rather than the default in-memory database, which refuses
+        # concurrent writers outright, for the bidding stress test
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
     }
 }
 
@@ -124,3 +130,7 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'), )
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/auctions/media/' 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'auctions/media')
+
+# Seconds between the reads of each watched auction by the event streams
+# of a process, to notice the bids accepted by other processes
+AUCTIONS_EVENTS_INTERVAL = 2